@@ -0,0 +1,49 @@
+"""add_foreign_key_and_filter_indexes
+
+Revision ID: 1e20a02b39fb
+Revises: 04b3ce1830c9
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "1e20a02b39fb"
+down_revision: Union[str, None] = "04b3ce1830c9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "comments": [("vehicle_id", "date"), ("user_id", "date")],
+    "documents": [("vehicle_id",), ("user_id",), ("file_type",)],
+    "events": [("vehicle_id", "date"), ("company_id", "date"), ("document_id",)],
+    "insurrances": [("vehicle_id", "date_to"), ("company_id", "date_to"), ("document_id",), ("date_to",)],
+    "refuels": [("vehicle_id", "date"), ("user_id", "date"), ("document_id",), ("date",)],
+    "reservations": [("vehicle_id", "date_from"), ("user_id", "date_from"), ("date_from",)],
+    "users": [("company_id", "role")],
+    "vehicles": [("company_id", "availability")],
+}
+
+
+def get_index_name(table: str, columns: tuple[str, ...]) -> str:
+    return f"ix_{table}_{'_'.join(columns)}"
+
+
+def upgrade() -> None:
+    # Built concurrently so large tables stay writable while the indexes are created
+    with op.get_context().autocommit_block():
+        for table, indexes in INDEXES.items():
+            for columns in indexes:
+                op.create_index(get_index_name(table, columns), table, list(columns), postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, indexes in INDEXES.items():
+            for columns in indexes:
+                op.drop_index(get_index_name(table, columns), table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,146 @@
+import os
+from collections import defaultdict
+from typing import Callable, Sequence, Type
+
+from pydantic import BaseModel
+from sqlalchemy import insert, literal, null, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import Select
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from users.models import User
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "1000"))
+
+References = dict[str, dict[int, int | None]]
+BatchCheck = Callable[[SQLModel, User, References], list[str]]
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: int | None = None
+    errors: list[str] = []
+
+
+class BatchResult(BaseModel):
+    applied: int
+    results: list[BatchItemResult]
+
+
+async def get_references(session: AsyncSession, model: Type[SQLModel], items: Sequence[SQLModel]) -> References:
+    queries = []
+    for foreign_key in model.__table__.foreign_keys:
+        name = foreign_key.parent.name
+        if not (ids := {getattr(item, name) for item in items} - {None}):
+            continue
+        table = foreign_key.column.table
+        company_id = table.c.company_id if "company_id" in table.c else null()
+        queries.append(select(literal(name).label("name"), foreign_key.column.label("id"), company_id.label("company_id")).where(foreign_key.column.in_(ids)))
+    references = defaultdict(dict)
+    if queries:
+        for name, obj_id, company_id in (await session.exec(union_all(*queries))).all():
+            references[name][obj_id] = company_id
+    return references
+
+
+def check_item_references(item: SQLModel, model: Type[SQLModel], references: References) -> list[str]:
+    errors = []
+    for foreign_key in model.__table__.foreign_keys:
+        name = foreign_key.parent.name
+        if (obj_id := getattr(item, name)) is not None and obj_id not in references[name]:
+            errors.append(f"The specified {name.removesuffix('_id')} does not exist.")
+    return errors
+
+
+def check_item_user_reference(item: SQLModel, request_user: User, references: References) -> list[str]:
+    if item.user_id is None or item.user_id not in references["user_id"]:
+        return []
+    if request_user.is_worker and not item.user_id == request_user.id:
+        return ["Insufficient permissions"]
+    if request_user.is_manager and not references["user_id"][item.user_id] == request_user.company_id:
+        return ["Insufficient permissions"]
+    return []
+
+
+def check_item_company_reference(item: SQLModel, request_user: User, references: References) -> list[str]:
+    if item.company_id is None:
+        return []
+    if (request_user.is_worker or request_user.is_manager) and not item.company_id == request_user.company_id:
+        return ["Insufficient permissions"]
+    return []
+
+
+async def validate_batch(session: AsyncSession, request_user: User, model: Type[SQLModel], items: Sequence[SQLModel], checks: Sequence[BatchCheck]) -> list[BatchItemResult]:
+    references = await get_references(session, model, items)
+    results = []
+    for index, item in enumerate(items):
+        errors = check_item_references(item, model, references)
+        for check in checks:
+            errors += check(item, request_user, references)
+        results.append(BatchItemResult(index=index, id=getattr(item, "id", None), errors=errors))
+    return results
+
+
+async def get_scoped_ids(session: AsyncSession, qs: Select, model: Type[SQLModel], ids: Sequence[int]) -> set[int]:
+    return set((await session.exec(qs.with_only_columns(model.id).where(model.id.in_(set(ids))))).all())
+
+
+async def reject_batch(session: AsyncSession, results: Sequence[BatchItemResult]) -> None:
+    await session.rollback()
+    for result in results:
+        result.errors.append("The batch violates a database constraint and was not applied.")
+
+
+def check_found(results: list[BatchItemResult], found_ids: set[int]) -> None:
+    seen = set()
+    for result in results:
+        if result.id not in found_ids:
+            result.errors.append("Not Found")
+        elif result.id in seen:
+            result.errors.append("Duplicate id.")
+        seen.add(result.id)
+
+
+async def create_batch(session: AsyncSession, request_user: User, model: Type[SQLModel], items: Sequence[SQLModel], checks: Sequence[BatchCheck] = ()) -> BatchResult:
+    results = await validate_batch(session, request_user, model, items, checks)
+    valid = [(result, item) for result, item in zip(results, items) if not result.errors]
+    if valid:
+        qs = insert(model).returning(model.id, sort_by_parameter_order=True)
+        try:
+            ids = (await session.exec(qs, params=[item.model_dump() for _, item in valid])).scalars().all()
+            await session.commit()
+        except IntegrityError:
+            await reject_batch(session, [result for result, _ in valid])
+            return BatchResult(applied=0, results=results)
+        for (result, _), obj_id in zip(valid, ids):
+            result.id = obj_id
+    return BatchResult(applied=len(valid), results=results)
+
+
+async def update_batch(session: AsyncSession, request_user: User, qs: Select, model: Type[SQLModel], items: Sequence[SQLModel], checks: Sequence[BatchCheck] = ()) -> BatchResult:
+    results = await validate_batch(session, request_user, model, items, checks)
+    check_found(results, await get_scoped_ids(session, qs, model, [item.id for item in items]))
+    valid = [(result, item.model_dump()) for result, item in zip(results, items) if not result.errors]
+    if valid:
+        try:
+            await session.exec(update(model), params=[values for _, values in valid])
+            await session.commit()
+        except IntegrityError:
+            await reject_batch(session, [result for result, _ in valid])
+            return BatchResult(applied=0, results=results)
+    return BatchResult(applied=len(valid), results=results)
+
+
+async def delete_batch(session: AsyncSession, qs: Select, model: Type[SQLModel], ids: Sequence[int]) -> BatchResult:
+    results = [BatchItemResult(index=index, id=obj_id) for index, obj_id in enumerate(ids)]
+    objs = (await session.exec(qs.where(model.id.in_(set(ids))))).all()
+    check_found(results, {obj.id for obj in objs})
+    if objs:
+        try:
+            for obj in objs:
+                await session.delete(obj)
+            await session.commit()
+        except IntegrityError:
+            await reject_batch(session, [result for result in results if not result.errors])
+            return BatchResult(applied=0, results=results)
+    return BatchResult(applied=len(objs), results=results)
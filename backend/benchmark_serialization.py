@@ -0,0 +1,103 @@
+import asyncio
+import os
+import sys
+import timeit
+from datetime import datetime
+
+import orjson
+
+os.environ.setdefault("DB_URL", "postgresql://localhost/fleetflow")
+
+from comments.models import Comment
+from commons import CursorPage, ModelResponse, Page, Params, rebuild_models
+from companies.models import Company
+from documents.models import Document
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from fastapi_pagination.api import create_page, set_page
+from refuels.models import Refuel
+from users.models import User, UserRole
+from vehicles.models import GearboxType, TireType, Vehicle, VehicleAvailability, VehicleRead
+
+PAGE_SIZE = 100
+NESTED_PER_VEHICLE = 5
+ROUNDS = 50
+
+
+def get_vehicles(count: int) -> list[Vehicle]:
+    company = Company(id=1, name="Company", post_code="00-000", address1="Street 1", address2="", city="City", country="Country", nip="1234567890")
+    user = User(id=1, email="user@example.com", name="User", role=UserRole.WORKER, company_id=company.id, password="")
+    vehicles = []
+    for i in range(count):
+        document = Document(id=i, title=f"Invoice {i}", file_type="invoice", vehicle_id=i, user_id=user.id)
+        vehicle = Vehicle(
+            id=i,
+            id_number=f"ID{i}",
+            vin=f"VIN{i:014d}",
+            weight=1500.0,
+            registration_number=f"REG{i}",
+            brand="Brand",
+            model="Model",
+            production_year=2020,
+            kilometrage=10000 + i,
+            gearbox_type=GearboxType.MANUAL,
+            availability=VehicleAvailability.AVAILABLE,
+            tire_type=TireType.ALLSEASON,
+            company_id=company.id,
+        )
+        vehicle.company = company
+        vehicle.documents = [document]
+        vehicle.refuels = [
+            Refuel(
+                id=i * NESTED_PER_VEHICLE + j,
+                date=datetime(2026, 1, j + 1),
+                fuel_amount=40.0,
+                price=250.0,
+                kilometrage_during_refuel=10000 + j,
+                gas_station="Station",
+                vehicle_id=i,
+                document_id=document.id,
+                user_id=user.id,
+            )
+            for j in range(NESTED_PER_VEHICLE)
+        ]
+        vehicle.comments = [
+            Comment(id=i * NESTED_PER_VEHICLE + j, content="Comment", vehicle_id=i, user_id=user.id, date=datetime(2026, 1, j + 1)) for j in range(NESTED_PER_VEHICLE)
+        ]
+        vehicles.append(vehicle)
+    return vehicles
+
+
+def main() -> int:
+    rebuild_models()
+    vehicles = get_vehicles(PAGE_SIZE)
+    params = Params(page=1, size=PAGE_SIZE)
+    page_type = CursorPage[VehicleRead]
+    response_field = create_model_field(name="Response", type_=Page[VehicleRead], mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    def create_vehicle_page() -> CursorPage:
+        with set_page(page_type):
+            return create_page(vehicles, params=params, total=PAGE_SIZE)
+
+    def default_path() -> bytes:
+        content = loop.run_until_complete(serialize_response(field=response_field, response_content=create_vehicle_page()))
+        return JSONResponse(content).body
+
+    def fast_path() -> bytes:
+        return ModelResponse(create_vehicle_page()).body
+
+    if orjson.loads(default_path()) != orjson.loads(fast_path()):
+        print("Serialization paths produce different payloads")
+        return 1
+
+    print(f"Page[VehicleRead] with {PAGE_SIZE} items, {NESTED_PER_VEHICLE} refuels and comments each, best of 5 x {ROUNDS} rounds")
+    for name, path in (("default", default_path), ("fast", fast_path)):
+        duration = min(timeit.repeat(path, number=ROUNDS, repeat=5)) / ROUNDS
+        print(f"  {name:<8} {duration * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import os
+import sys
+
+os.environ.setdefault("DB_URL", "postgresql://localhost/fleetflow")
+
+from comments.models import Comment
+from companies.models import Company
+from documents.models import Document
+from events.models import Event
+from insurrances.models import Insurrance
+from refuels.models import Refuel
+from reservations.models import Reservation
+from sqlalchemy import MetaData, PrimaryKeyConstraint, Table, UniqueConstraint
+from sqlmodel import SQLModel
+from users.models import User
+from vehicles.models import Vehicle
+
+
+def get_leading_columns(table: Table) -> list[tuple[str, ...]]:
+    leading_columns = [tuple(column.name for column in index.columns) for index in table.indexes]
+    leading_columns += [tuple(column.name for column in constraint.columns) for constraint in table.constraints if isinstance(constraint, (PrimaryKeyConstraint, UniqueConstraint))]
+    return leading_columns
+
+
+def get_unindexed_foreign_keys(metadata: MetaData) -> list[str]:
+    unindexed = []
+    for table in metadata.sorted_tables:
+        leading_columns = get_leading_columns(table)
+        for foreign_key in table.foreign_key_constraints:
+            columns = {column.name for column in foreign_key.columns}
+            if not any(set(index_columns[: len(columns)]) == columns for index_columns in leading_columns):
+                unindexed.append(f"{table.name}({', '.join(sorted(columns))})")
+    return unindexed
+
+
+def main() -> int:
+    if unindexed := get_unindexed_foreign_keys(SQLModel.metadata):
+        print("Foreign keys without a covering index:")
+        for foreign_key in unindexed:
+            print(f"  {foreign_key}")
+        return 1
+    print("All foreign keys are indexed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator
+
+os.environ.setdefault("DB_URL", "postgresql://localhost/fleetflow")
+
+from comments.models import Comment
+from companies.models import Company
+from database import engine
+from documents.models import Document
+from events.models import Event
+from events.views import get_list_queryset as get_event_list_queryset
+from insurrances.models import Insurrance
+from insurrances.views import get_list_queryset as get_insurrance_list_queryset
+from refuels.models import Refuel
+from refuels.utils import get_yearly_stats_query
+from refuels.views import get_list_queryset as get_refuel_list_queryset
+from reservations.models import Reservation
+from reservations.views import get_list_queryset as get_reservation_list_queryset
+from sqlalchemy import func, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+from sqlmodel import Session, select
+from users.models import User, UserRole
+from vehicles.models import Vehicle, VehicleAvailability
+from vehicles.utils import get_refuel_rows_query
+
+PAGE_SIZE = 15
+SEARCH_TERM = "ford"
+# Nodes that consume their whole input before returning the first row, so a LIMIT above them does not bound the scan below.
+BLOCKING_NODES = {"Sort", "Incremental Sort", "Aggregate", "Hash", "Materialize", "WindowAgg", "SetOp"}
+
+
+@dataclass
+class PlanCase:
+    name: str
+    qs: Select
+    allow_seq_scan: bool = False
+
+
+def get_sample_users(session: Session) -> list[User]:
+    company_id = session.exec(select(Vehicle.company_id).group_by(Vehicle.company_id).order_by(func.count().desc()).limit(1)).first()
+    users = [session.exec(select(User).where(User.role == UserRole.ADMIN).order_by(User.id).limit(1)).first()]
+    for role in (UserRole.MANAGER, UserRole.WORKER):
+        users.append(session.exec(select(User).where(User.company_id == company_id, User.role == role).order_by(User.id).limit(1)).first())
+    return [user for user in users if user is not None]
+
+
+def get_cases(user: User, vehicle_id: int) -> Iterator[PlanCase]:
+    role = user.role.value
+    for model in (Comment, Company, Document, Event, Insurrance, Refuel, Reservation, User, Vehicle):
+        yield PlanCase(f"{model.__name__}.for_user[{role}]", model.for_user(user).limit(PAGE_SIZE))
+    for model in (Company, Document, Refuel, User, Vehicle):
+        yield PlanCase(f"{model.__name__}.with_search[{role}]", model.with_search(model.for_user(user), SEARCH_TERM).limit(PAGE_SIZE))
+    yield PlanCase(f"Vehicle.with_status[{role}]", Vehicle.with_status(Vehicle.for_user(user), VehicleAvailability.AVAILABLE).limit(PAGE_SIZE))
+    yield PlanCase(f"User.with_role[{role}]", User.with_role(User.for_user(user), UserRole.WORKER).limit(PAGE_SIZE))
+    yield PlanCase(f"Document.with_type[{role}]", Document.with_type(Document.for_user(user), "receipt").limit(PAGE_SIZE))
+    yield PlanCase(f"Reservation.upcoming[{role}]", Reservation.upcoming(Reservation.for_user(user)).limit(PAGE_SIZE))
+    yield PlanCase(f"Insurrance.finishing[{role}]", Insurrance.finishing(Insurrance.for_user(user)).limit(PAGE_SIZE))
+    for name, get_list_queryset in (
+        ("Event", get_event_list_queryset),
+        ("Insurrance", get_insurrance_list_queryset),
+        ("Refuel", get_refuel_list_queryset),
+        ("Reservation", get_reservation_list_queryset),
+    ):
+        yield PlanCase(f"{name}.list[{role}, vehicle_id]", get_list_queryset(user, vehicle_id=vehicle_id).limit(PAGE_SIZE))
+    start = (datetime.today().replace(day=1) - timedelta(days=365)).replace(day=1)
+    yield PlanCase(f"get_yearly_stats[{role}]", get_yearly_stats_query(user, start), allow_seq_scan=True)
+
+
+def get_plan(connection: Connection, qs: Select) -> dict:
+    sql = qs.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return plan[0]["Plan"]
+
+
+def get_seq_scans(node: dict, big_tables: set[str], limited: bool = False) -> list[str]:
+    if node["Node Type"] == "Limit":
+        limited = True
+    elif node["Node Type"] in BLOCKING_NODES:
+        limited = False
+    seq_scans = []
+    if node["Node Type"] == "Seq Scan" and node["Relation Name"] in big_tables and not (limited and "Filter" not in node):
+        seq_scans.append(node["Relation Name"])
+    for child in node.get("Plans", []):
+        seq_scans += get_seq_scans(child, big_tables, limited)
+    return seq_scans
+
+
+def get_big_tables(connection: Connection, min_rows: int) -> set[str]:
+    tables = [model.__tablename__ for model in (Comment, Company, Document, Event, Insurrance, Refuel, Reservation, User, Vehicle)]
+    rows = connection.execute(text("SELECT relname FROM pg_class WHERE relname = ANY(:tables) AND reltuples >= :min_rows"), {"tables": tables, "min_rows": min_rows})
+    return set(rows.scalars())
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="EXPLAIN every view queryset on a seeded database and fail on sequential scans of big tables or cost regressions.")
+    parser.add_argument("--baseline", default="query_plans.json", help="file with the estimated costs of a previous run")
+    parser.add_argument("--update-baseline", action="store_true", help="write the current estimated costs to the baseline file")
+    parser.add_argument("--max-cost-increase", type=float, default=0.5, help="allowed relative increase of the estimated cost")
+    parser.add_argument("--min-cost", type=float, default=1000, help="costs below this are never reported as regressions")
+    parser.add_argument("--min-rows", type=int, default=10000, help="tables with at least this many rows must not be scanned sequentially")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    with Session(engine) as session:
+        users = get_sample_users(session)
+        vehicle_id = session.exec(select(Refuel.vehicle_id).group_by(Refuel.vehicle_id).order_by(func.count().desc()).limit(1)).first()
+        if not users or vehicle_id is None:
+            print("The database is empty, seed it with seed_scale_data.py first")
+            return 1
+        connection = session.connection()
+        big_tables = get_big_tables(connection, args.min_rows)
+        cases = [case for user in users for case in get_cases(user, vehicle_id)]
+        cases.append(PlanCase("get_refuel_rows_query", get_refuel_rows_query(vehicle_id)))
+
+        costs, failures = {}, []
+        for case in cases:
+            plan = get_plan(connection, case.qs)
+            costs[case.name] = cost = plan["Total Cost"]
+            problems = []
+            if not case.allow_seq_scan and (seq_scans := get_seq_scans(plan, big_tables)):
+                problems.append(f"sequential scan on {', '.join(sorted(set(seq_scans)))}")
+            if (previous := baseline.get(case.name)) is not None and cost > args.min_cost and cost > previous * (1 + args.max_cost_increase):
+                problems.append(f"cost {previous:.0f} -> {cost:.0f}")
+            print(f"{'FAIL' if problems else 'ok':<5} {case.name:<44} {cost:>12.1f}  {'; '.join(problems)}")
+            if problems:
+                failures.append(case.name)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(costs, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+    if failures:
+        print(f"{len(failures)} of {len(cases)} query plans failed")
+        return 1
+    print(f"All {len(cases)} query plans passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import os
+import re
+import sys
+
+import httpx
+
+os.environ.setdefault("DB_URL", "postgresql://localhost/fleetflow")
+
+from check_query_plans import SEARCH_TERM, get_sample_users
+from database import engine
+from fastapi.routing import APIRoute
+from main import app
+from refuels.models import Refuel
+from sqlalchemy import func
+from sqlmodel import Session, select
+from users.models import User
+from users.utils import create_access_token
+
+SKIPPED_ROUTES = {"/metrics", "/monitoring/pool/"}
+PATH_PARAM = re.compile(r"{(\w+)}")
+
+
+def get_requests(user: User, vehicle_id: int) -> list[tuple[str, dict]]:
+    path_values = {"vehicle_id": vehicle_id, "company_id": user.company_id}
+    requests = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or "GET" not in route.methods or route.path in SKIPPED_ROUTES:
+            continue
+        names = PATH_PARAM.findall(route.path)
+        if any(path_values.get(name) is None for name in names):
+            continue
+        path = route.path.format(**{name: path_values[name] for name in names})
+        query_params = {param.name for param in route.dependant.query_params}
+        requests.append((path, {"q": SEARCH_TERM} if "q" in query_params else {}))
+        if "search" in query_params:
+            requests.append((path, {"search": SEARCH_TERM}))
+        if "vehicle_id" in query_params:
+            requests.append((path, {"vehicle_id": vehicle_id}))
+    return requests
+
+
+async def check_user(client: httpx.AsyncClient, user: User, vehicle_id: int) -> list[str]:
+    failures = []
+    client.cookies.set("token", create_access_token(user.email))
+    for path, params in get_requests(user, vehicle_id):
+        response = await client.get(path, params=params)
+        failed = response.status_code >= 500
+        print(f"{'FAIL' if failed else 'ok':<5} {user.role.value:<8} {response.status_code} {response.request.url.raw_path.decode()}")
+        if failed:
+            failures.append(f"{user.role.value} {path}")
+    return failures
+
+
+async def run() -> int:
+    with Session(engine) as session:
+        users = get_sample_users(session)
+        vehicle_id = session.exec(select(Refuel.vehicle_id).group_by(Refuel.vehicle_id).order_by(func.count().desc()).limit(1)).first()
+    if not users or vehicle_id is None:
+        print("The database is empty, seed it with seed_scale_data.py first")
+        return 1
+
+    failures = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        for user in users:
+            async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+                failures += await check_user(client, user, vehicle_id)
+    if failures:
+        print(f"{len(failures)} requests failed")
+        return 1
+    print("All routes responded without server errors")
+    return 0
+
+
+def main() -> int:
+    argparse.ArgumentParser(description="Call every read-only route as an admin, manager and worker through the app's async engine and fail on 5xx responses.").parse_args()
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
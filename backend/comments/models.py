@@ -3,7 +3,7 @@ from typing import TYPE_CHECKING
 
 from database import SQLModel
 from sqlalchemy.sql import Select
-from sqlmodel import Field, Relationship, select
+from sqlmodel import Field, Index, Relationship, select
 
 if TYPE_CHECKING:
     from users.models import User, UserNestedRead
@@ -19,17 +19,22 @@ class CommentBase(SQLModel):
 
 class Comment(CommentBase, table=True):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_vehicle_id_date", "vehicle_id", "date"),
+        Index("ix_comments_user_id_date", "user_id", "date"),
+    )
     id: int | None = Field(primary_key=True, default=None)
     vehicle: "Vehicle" = Relationship(back_populates="comments")
     user: "User" = Relationship(back_populates="comments")
 
     @classmethod
     def for_user(cls, user: "User") -> Select["Comment"]:
+        from scopes import get_scope
+
         qs = select(cls)
-        if not user.is_admin:
-            subordinates = user.get_subordinates()
-            suboridante_comments = select(cls).filter(cls.user_id.in_(subordinates))
-            qs = qs.filter(cls.user_id == user.id).union(suboridante_comments)
+        scope = get_scope(user)
+        if not scope.is_admin:
+            qs = qs.filter(cls.user_id.in_(scope.own_and_subordinate_ids()))
         return qs
 
 
@@ -45,3 +50,7 @@ class CommentNestedRead(CommentBase):
 
 class CommentCreate(CommentBase):
     content: str = Field(min_length=1, max_length=1000, description="Comment content")
+
+
+class CommentBatchUpdate(CommentCreate):
+    id: int
@@ -1,13 +1,12 @@
-from commons import get_filters, get_from_qs_or_404, validate_obj_reference, validate_user_reference
-from dependencies import LoginReqDep, SessionDep
-from fastapi import APIRouter, Query, Response, status
-from fastapi_pagination import Page
-from fastapi_pagination.ext.sqlalchemy import paginate
+from batches import BATCH_MAX_SIZE, BatchResult, check_item_user_reference, create_batch, delete_batch, update_batch
+from commons import LargePage, get_filters, get_from_qs_or_404, paginate, render, serialize, validate_obj_reference, validate_user_reference, with_load_options
+from dependencies import FieldsetDep, LoginReqDep, SessionDep
+from fastapi import APIRouter, Body, Query, status
 from sqlalchemy.sql import Select
 from users.models import User
 from vehicles.models import Vehicle
 
-from .models import Comment, CommentCreate, CommentRead
+from .models import Comment, CommentBatchUpdate, CommentCreate, CommentRead
 
 router = APIRouter(prefix="/comments", tags=["comments"])
 
@@ -20,12 +19,40 @@ def get_queryset(request_user: User) -> Select[Comment]:
 async def list_comments(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     vehicle_id: int = Query(None),
     user_id: int = Query(None),
-) -> Page[CommentRead]:
+) -> LargePage[CommentRead]:
     filters = get_filters({"vehicle_id": vehicle_id, "user_id": user_id})
     qs = get_queryset(request_user).filter_by(**filters)
-    return paginate(session, qs)
+    return await paginate(session, qs, CommentRead, fieldset)
+
+
+@router.post("/batch/")
+async def create_comments(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    comments: list[CommentCreate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await create_batch(session, request_user, Comment, comments, (check_item_user_reference,))
+
+
+@router.put("/batch/")
+async def update_comments(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    comments: list[CommentBatchUpdate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await update_batch(session, request_user, get_queryset(request_user), Comment, comments)
+
+
+@router.delete("/batch/")
+async def delete_comments(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    ids: list[int] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await delete_batch(session, get_queryset(request_user), Comment, ids)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -33,28 +60,28 @@ async def create_comment(
     session: SessionDep,
     request_user: LoginReqDep,
     comment: CommentCreate,
-    response: Response,
 ) -> CommentRead:
-    validate_obj_reference(session, comment, Vehicle, comment.vehicle_id)
-    validate_obj_reference(session, comment, User, comment.user_id)
-    validate_user_reference(session, comment, request_user)
+    await validate_obj_reference(session, comment, Vehicle, comment.vehicle_id)
+    await validate_obj_reference(session, comment, User, comment.user_id)
+    await validate_user_reference(session, comment, request_user)
 
     db_comment = Comment.model_validate(comment)
     session.add(db_comment)
-    session.commit()
-    session.refresh(db_comment)
-    response.status_code = status.HTTP_201_CREATED
-    return db_comment
+    await session.commit()
+    await session.refresh(db_comment)
+    return render(await serialize(session, CommentRead, db_comment), status.HTTP_201_CREATED)
 
 
 @router.get("/{comment_id}/")
 async def retrieve_comment(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     comment_id: int,
 ) -> CommentRead:
-    qs = get_queryset(request_user)
-    return get_from_qs_or_404(session, qs, comment_id)
+    qs = with_load_options(get_queryset(request_user), CommentRead, fieldset)
+    db_comment = await get_from_qs_or_404(session, qs, comment_id)
+    return render(await serialize(session, CommentRead, db_comment, fieldset))
 
 
 @router.put("/{comment_id}/")
@@ -64,15 +91,15 @@ async def update_comment(
     comment_id: int,
     comment: CommentCreate,
 ) -> CommentRead:
-    validate_obj_reference(session, comment, Vehicle, comment.vehicle_id)
-    validate_obj_reference(session, comment, User, comment.user_id)
+    await validate_obj_reference(session, comment, Vehicle, comment.vehicle_id)
+    await validate_obj_reference(session, comment, User, comment.user_id)
 
     qs = get_queryset(request_user)
-    db_comment = get_from_qs_or_404(session, qs, comment_id)
+    db_comment = await get_from_qs_or_404(session, qs, comment_id)
     db_comment.sqlmodel_update(comment)
-    session.commit()
-    session.refresh(db_comment)
-    return db_comment
+    await session.commit()
+    await session.refresh(db_comment)
+    return render(await serialize(session, CommentRead, db_comment))
 
 
 @router.delete("/{comment_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -82,6 +109,6 @@ async def delete_comment(
     comment_id: int,
 ) -> None:
     qs = get_queryset(request_user)
-    db_comment = get_from_qs_or_404(session, qs, comment_id)
-    session.delete(db_comment)
-    session.commit()
+    db_comment = await get_from_qs_or_404(session, qs, comment_id)
+    await session.delete(db_comment)
+    await session.commit()
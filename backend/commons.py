@@ -1,45 +1,323 @@
-from typing import Type, TypeVar
+import base64
+import json
+import os
+from datetime import date, datetime
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Generic, Sequence, Type, TypeVar, get_args
 
 from fastapi import HTTPException, Query, status
-from fastapi_pagination import Page
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from fastapi_pagination import Page as BasePage
+from fastapi_pagination import Params as BaseParams
+from fastapi_pagination.api import create_page, resolve_params, set_page
 from fastapi_pagination.customization import CustomizedPage, UseParamsFields
-from sqlalchemy.sql import Select
-from sqlmodel import Session, select
+from fastapi_pagination.ext.sqlalchemy import paginate as paginate_sqlalchemy
+from monitoring.timing import measure_serialization
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from sqlalchemy import BigInteger, Column, and_, func, inspect, or_, text, tuple_
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from sqlalchemy.orm.strategy_options import _AbstractLoad
+from sqlalchemy.sql import ColumnElement, Select, operators
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from users.models import User
 
 T = TypeVar("T")
 
+COUNT_CAP = int(os.getenv("PAGINATION_COUNT_CAP", "10000"))
 
-Page = CustomizedPage[Page[T], UseParamsFields(size=Query(15, ge=1, le=100))]
 
+class CountStrategy(str, Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    CAPPED = "capped"
+    NONE = "none"
 
-def get_obj(session: Session, model: Type[T], obj_id: int) -> T | None:
-    return session.get(model, obj_id)
 
+class Params(BaseParams):
+    cursor: str | None = Query(None, description="Keyset pagination cursor, pass an empty value for the first page and next_cursor afterwards")
+    count: CountStrategy = Query(CountStrategy.EXACT, description=f"How the total is counted, capped stops at {COUNT_CAP}")
 
-def get_obj_or_404(session: Session, model: Type[T], obj_id: int) -> T:
-    if obj := get_obj(session, model, obj_id):
+
+class CursorPage(BasePage[T], Generic[T]):
+    next_cursor: str | None = None
+    total_approximate: bool = False
+
+    __params_type__ = Params
+
+
+class ModelResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        with measure_serialization():
+            if isinstance(content, BaseModel):
+                return get_type_adapter(type(content)).dump_json(content)
+            return super().render(content)
+
+
+@lru_cache(maxsize=None)
+def get_type_adapter(annotation: Any) -> TypeAdapter:
+    return TypeAdapter(annotation)
+
+
+Page = CustomizedPage[CursorPage[T], UseParamsFields(size=Query(15, ge=1, le=100))]
+LargePage = CustomizedPage[CursorPage[T], UseParamsFields(size=Query(50, ge=1, le=100))]
+
+
+def get_order_by(qs: Select) -> list[tuple[ColumnElement, bool]]:
+    order_by = []
+    for clause in qs._order_by_clauses:
+        descending = isinstance(clause, UnaryExpression) and clause.modifier is operators.desc_op
+        order_by.append((clause.element if isinstance(clause, UnaryExpression) else clause, descending))
+    return order_by
+
+
+def has_keyset_order(qs: Select) -> bool:
+    model = qs.column_descriptions[0]["entity"]
+    return all(isinstance(column, Column) and column.table is model.__table__ for column, _ in get_order_by(qs))
+
+
+def get_keyset(qs: Select) -> list[tuple[Column, bool]]:
+    primary_key = qs.column_descriptions[0]["entity"].__table__.c.id
+    if not has_keyset_order(qs):
+        return [(primary_key, False)]
+    keyset = get_order_by(qs)
+    if not any(column.key == "id" for column, _ in keyset):
+        keyset.append((primary_key, keyset[-1][1] if keyset else False))
+    return keyset
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(jsonable_encoder(values)).encode()).decode()
+
+
+def decode_cursor_value(column: Column, value: Any) -> Any:
+    python_type = column.type.python_type
+    if value is None:
+        return None
+    if python_type in (date, datetime):
+        return datetime.fromisoformat(value)
+    value = python_type(value)
+    if python_type is int and value.bit_length() >= (64 if isinstance(column.type, BigInteger) else 32):
+        raise OverflowError
+    return value
+
+
+def decode_cursor(cursor: str, keyset: list[tuple[Column, bool]]) -> list[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(keyset):
+            raise ValueError
+        return [decode_cursor_value(column, val) for (column, _), val in zip(keyset, values)]
+    except (ValueError, TypeError, OverflowError):
+        raise_validation_error("Invalid pagination cursor.", {"cursor": cursor})
+
+
+def get_keyset_filter(keyset: list[tuple[Column, bool]], values: list[Any]) -> ColumnElement[bool]:
+    if len({descending for _, descending in keyset}) == 1:
+        columns, values = tuple_(*(column for column, _ in keyset)), tuple_(*values)
+        return columns < values if keyset[0][1] else columns > values
+    conditions = []
+    for i, (column, descending) in enumerate(keyset):
+        preceding = [keyset[j][0] == values[j] for j in range(i)]
+        conditions.append(and_(*preceding, column < values[i] if descending else column > values[i]))
+    return or_(*conditions)
+
+
+async def paginate_keyset(session: AsyncSession, qs: Select, params: Params) -> CursorPage:
+    if not has_keyset_order(qs):
+        raise_validation_error("Cursor pagination is not available for search results, use page instead.", {"cursor": params.cursor})
+    keyset = get_keyset(qs)
+    if params.cursor:
+        qs = qs.filter(get_keyset_filter(keyset, decode_cursor(params.cursor, keyset)))
+    qs = qs.order_by(None).order_by(*(column.desc() if descending else column.asc() for column, descending in keyset)).limit(params.size + 1)
+
+    items = (await session.exec(qs)).unique().all()
+    next_cursor = None
+    if len(items) > params.size:
+        items = items[: params.size]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column, _ in keyset])
+    with measure_serialization():
+        return await session.run_sync(lambda _: create_page(items, params=params, next_cursor=next_cursor))
+
+
+async def get_estimated_count(session: AsyncSession, qs: Select) -> int:
+    model = qs.column_descriptions[0]["entity"]
+    if qs.whereclause is None and not qs._setup_joins:
+        reltuples = text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table_name AS regclass)").bindparams(table_name=model.__tablename__)
+        if (rows := (await session.exec(reltuples)).scalar()) >= 0:
+            return rows
+
+    connection = await session.connection()
+    sql = qs.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def get_total(session: AsyncSession, qs: Select, count: CountStrategy) -> tuple[int | None, bool]:
+    qs = qs.order_by(None)
+    if count == CountStrategy.NONE:
+        return None, False
+    if count == CountStrategy.ESTIMATED and session.get_bind().dialect.name == "postgresql":
+        return await get_estimated_count(session, qs), True
+    if count == CountStrategy.CAPPED:
+        total = (await session.exec(select(func.count()).select_from(qs.limit(COUNT_CAP + 1).subquery()))).one()
+        return min(total, COUNT_CAP), total > COUNT_CAP
+    return (await session.exec(select(func.count()).select_from(qs.subquery()))).one(), False
+
+
+async def paginate_offset(session: AsyncSession, qs: Select, params: Params) -> CursorPage:
+    total, total_approximate = await get_total(session, qs, params.count)
+    raw_params = params.to_raw_params()
+    items = (await session.exec(qs.limit(raw_params.limit).offset(raw_params.offset))).unique().all()
+    with measure_serialization():
+        return await session.run_sync(lambda _: create_page(items, params=params, total=total, total_approximate=total_approximate))
+
+
+def get_nested_model(annotation: Any) -> Type[BaseModel] | None:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in get_args(annotation):
+        if nested_model := get_nested_model(arg):
+            return nested_model
+    return None
+
+
+class Fieldset(BaseModel):
+    fields: set[str] | None = None
+    expand: set[str] = set()
+
+    def get_field_names(self, read_model: Type[BaseModel]) -> frozenset[str] | None:
+        if self.fields is None and not self.expand:
+            return None
+        relations = {name for name, field in read_model.model_fields.items() if get_nested_model(field.annotation)}
+        if unknown := (self.fields or set()) - read_model.model_fields.keys():
+            raise_validation_error("Unknown fields requested.", {"fields": sorted(unknown)})
+        if unknown := self.expand - relations:
+            raise_validation_error("Only relations can be expanded.", {"expand": sorted(unknown)})
+        fields = self.fields if self.fields is not None else read_model.model_fields.keys() - relations
+        return frozenset(fields | self.expand | ({"id"} & read_model.model_fields.keys()))
+
+
+@lru_cache(maxsize=512)
+def get_load_options(model: Type[T], read_model: Type[BaseModel], field_names: frozenset[str] | None = None) -> tuple[_AbstractLoad, ...]:
+    relationships = inspect(model).relationships
+    options = []
+    for name, field in read_model.model_fields.items():
+        if field_names is not None and name not in field_names:
+            continue
+        if name not in relationships or not (nested_model := get_nested_model(field.annotation)):
+            continue
+        relationship = relationships[name]
+        loader = selectinload if relationship.uselist else joinedload
+        options.append(loader(getattr(model, name)).options(*get_load_options(relationship.mapper.class_, nested_model)))
+    return tuple(options)
+
+
+@lru_cache(maxsize=512)
+def get_sparse_model(read_model: Type[BaseModel], field_names: frozenset[str]) -> Type[BaseModel]:
+    fields = {name: (field.annotation, field) for name, field in read_model.model_fields.items() if name in field_names}
+    return create_model(read_model.__name__, __config__=ConfigDict(from_attributes=True), **fields)
+
+
+def with_load_options(qs: Select, read_model: Type[BaseModel], fieldset: Fieldset | None = None) -> Select:
+    if not isinstance(qs, Select):
+        return qs
+    model = qs.column_descriptions[0]["entity"]
+    field_names = fieldset.get_field_names(read_model) if fieldset else None
+    qs = qs.options(*get_load_options(model, read_model, field_names))
+    if field_names is None:
+        return qs
+    columns = {name for name in field_names if name in model.__table__.c} | {column.key for column, _ in get_keyset(qs)}
+    return qs.options(load_only(*(getattr(model, name) for name in columns)))
+
+
+async def paginate_select(session: AsyncSession, qs: Select, params: Params) -> CursorPage:
+    if params.cursor is not None:
+        return await paginate_keyset(session, qs, params)
+    return await paginate_offset(session, qs, params)
+
+
+async def paginate(session: AsyncSession, qs: Select, read_model: Type[BaseModel] | None = None, fieldset: Fieldset | None = None) -> ModelResponse:
+    params = resolve_params()
+    if not isinstance(qs, Select):
+        return ModelResponse(await paginate_sqlalchemy(session, qs))
+    field_names = fieldset.get_field_names(read_model) if read_model and fieldset else None
+    if read_model:
+        qs = with_load_options(qs, read_model, fieldset)
+    if field_names is None:
+        return ModelResponse(await paginate_select(session, qs, params))
+    with set_page(CursorPage[get_sparse_model(read_model, field_names)]):
+        return ModelResponse(await paginate_select(session, qs, params))
+
+
+async def get_obj(session: AsyncSession, model: Type[T], obj_id: int) -> T | None:
+    return await session.get(model, obj_id)
+
+
+async def get_obj_or_404(session: AsyncSession, model: Type[T], obj_id: int) -> T:
+    if obj := await get_obj(session, model, obj_id):
         return obj
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
 
-def get_from_qs_or_404(session: Session, qs: Select, obj_id: int) -> T:
+async def get_from_qs_or_404(session: AsyncSession, qs: Select, obj_id: int) -> T:
     qs = qs.filter_by(id=obj_id)
-    if obj := session.exec(qs).first():
+    if obj := (await session.exec(qs)).first():
         return obj
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
 
-def get_user(session: Session, email: str) -> User | None:
-    return session.exec(select(User).where(User.email == email)).first()
+async def get_user(session: AsyncSession, email: str) -> User | None:
+    return (await session.exec(select(User).where(User.email == email))).first()
 
 
-def get_user_or_404(session: Session, email: str) -> User:
-    if user := get_user(session, email):
+async def get_user_or_404(session: AsyncSession, email: str) -> User:
+    if user := await get_user(session, email):
         return user
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
 
+async def serialize(session: AsyncSession, read_model: Type[T], obj: object, fieldset: Fieldset | None = None) -> T:
+    if fieldset and (field_names := fieldset.get_field_names(read_model)) is not None:
+        read_model = get_sparse_model(read_model, field_names)
+    # Relationships are lazy loaded during validation, which needs the session's greenlet
+    with measure_serialization():
+        return await session.run_sync(lambda _: get_type_adapter(read_model).validate_python(obj, from_attributes=True))
+
+
+def render(content: BaseModel, status_code: int = status.HTTP_200_OK) -> ModelResponse:
+    return ModelResponse(content, status_code=status_code)
+
+
+class StreamBuffer:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
 def get_filters(fields: dict) -> dict:
     return {key: val for key, val in fields.items() if val}
 
@@ -73,22 +351,22 @@ def raise_validation_error(msg: str, input: dict = None, ctx: dict = None) -> No
     raise_http_error(status.HTTP_422_UNPROCESSABLE_ENTITY, msg, input, ctx)
 
 
-def validate_obj_reference(session: Session, referencing_obj: T, referenced_model: Type[T], referenced_obj_id: int | None) -> None:
-    if referenced_obj_id and not get_obj(session, referenced_model, referenced_obj_id):
+async def validate_obj_reference(session: AsyncSession, referencing_obj: T, referenced_model: Type[T], referenced_obj_id: int | None) -> None:
+    if referenced_obj_id and not await get_obj(session, referenced_model, referenced_obj_id):
         raise_validation_error(f"The specified {referenced_model.__name__.lower()} does not exist.", referencing_obj.model_dump(mode="json"))
 
 
-def validate_user_reference(session: Session, referencing_obj: T, request_user: User) -> None:
+async def validate_user_reference(session: AsyncSession, referencing_obj: T, request_user: User) -> None:
     if referencing_obj.user_id is None:
         return
     if request_user.is_worker and not referencing_obj.user_id == request_user.id:
         raise_perm_error(referencing_obj.model_dump(mode="json"))
-    user = get_obj(session, User, referencing_obj.user_id)
+    user = await get_obj(session, User, referencing_obj.user_id)
     if request_user.is_manager and not user.company_id == request_user.company_id:
         raise_perm_error(referencing_obj.model_dump(mode="json"))
 
 
-def validate_company_reference(session: Session, referencing_obj: T, request_user: User) -> None:
+async def validate_company_reference(session: AsyncSession, referencing_obj: T, request_user: User) -> None:
     if referencing_obj.company_id is None:
         return
     if (request_user.is_worker or request_user.is_manager) and not referencing_obj.company_id == request_user.company_id:
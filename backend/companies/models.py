@@ -1,9 +1,10 @@
 from typing import TYPE_CHECKING
 
 from database import SQLModel
+from search.utils import get_search_rank
 from sqlalchemy import or_
-from sqlalchemy.sql import Select
-from sqlmodel import Field, Relationship, select
+from sqlalchemy.sql import ColumnElement, Select
+from sqlmodel import Field, Index, Relationship, select
 
 if TYPE_CHECKING:
     from events.models import Event, EventNestedRead
@@ -27,6 +28,10 @@ class CompanyBase(SQLModel):
 
 class Company(CompanyBase, table=True):
     __tablename__ = "companies"
+    __table_args__ = (
+        Index("ix_companies_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_companies_nip_trgm", "nip", postgresql_using="gin", postgresql_ops={"nip": "gin_trgm_ops"}),
+    )
     id: int | None = Field(primary_key=True, default=None)
     vehicles: list["Vehicle"] = Relationship(back_populates="company", cascade_delete=True)
     users: list["User"] = Relationship(back_populates="company", cascade_delete=True)
@@ -35,11 +40,12 @@ class Company(CompanyBase, table=True):
 
     @classmethod
     def for_user(cls, user: "User") -> Select["Company"]:
-        from users.models import User
+        from scopes import get_scope
 
         qs = select(cls)
-        if not user.is_admin:
-            qs = qs.filter(cls.users.any(User.id == user.id))
+        scope = get_scope(user)
+        if not scope.is_admin:
+            qs = qs.filter(cls.id == scope.company_id)
         return qs
 
     @classmethod
@@ -48,7 +54,16 @@ class Company(CompanyBase, table=True):
             return query
 
         search_pattern = f"%{search_term}%"
-        return query.filter(or_(cls.name.ilike(search_pattern), cls.nip.ilike(search_pattern)))
+        query = query.filter(or_(cls.name.ilike(search_pattern), cls.nip.ilike(search_pattern)))
+        return query.order_by(None).order_by(cls.search_rank(search_term).desc(), cls.id)
+
+    @classmethod
+    def search_rank(cls, search_term: str) -> ColumnElement[float]:
+        return get_search_rank(search_term, cls.name, cls.nip)
+
+    @classmethod
+    def search_label(cls) -> ColumnElement[str]:
+        return cls.name
 
 
 class CompanyRead(CompanyBase):
@@ -1,9 +1,13 @@
-from commons import Page, get_filters, get_from_qs_or_404
-from dependencies import LoginReqDep, SessionDep
+from commons import Page, get_filters, get_from_qs_or_404, paginate, render, serialize, with_load_options
+from dependencies import FieldsetDep, LoginReqDep, SessionDep
 from fastapi import APIRouter, Query, Response, status
-from fastapi_pagination.ext.sqlalchemy import paginate
+from fastapi.responses import StreamingResponse
+from permissions import require_role
 from sqlalchemy.sql import Select
-from users.models import User
+from users.models import User, UserRole
+from users.utils import token_cache
+from vehicles.models import Vehicle
+from vehicles.utils import get_fuel_report_jobs, stream_fuel_reports
 
 from .models import Company, CompanyCreate, CompanyRead
 
@@ -20,11 +24,12 @@ def get_queryset(request_user: User) -> Select[Company]:
 async def list_companies(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     search: str = Query(None, description="Search by company name or NIP"),
 ) -> Page[CompanyRead]:
     qs = get_queryset(request_user)
     qs = Company.with_search(qs, search)
-    return paginate(session, qs)
+    return await paginate(session, qs, CompanyRead, fieldset)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -32,24 +37,38 @@ async def create_company(
     session: SessionDep,
     request_user: LoginReqDep,
     company: CompanyCreate,
-    response: Response,
 ) -> CompanyRead:
     db_company = Company.model_validate(company)
     session.add(db_company)
-    session.commit()
-    session.refresh(db_company)
-    response.status_code = status.HTTP_201_CREATED
-    return db_company
+    await session.commit()
+    await session.refresh(db_company)
+    return render(await serialize(session, CompanyRead, db_company), status.HTTP_201_CREATED)
 
 
 @router.get("/{company_id}/")
 async def retrive_company(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     company_id: int,
 ) -> CompanyRead:
-    qs = get_queryset(request_user)
-    return get_from_qs_or_404(session, qs, company_id)
+    qs = with_load_options(get_queryset(request_user), CompanyRead, fieldset)
+    db_company = await get_from_qs_or_404(session, qs, company_id)
+    return render(await serialize(session, CompanyRead, db_company, fieldset))
+
+
+@router.get("/{company_id}/reports/fuel/")
+@require_role([UserRole.ADMIN, UserRole.MANAGER])
+async def generate_company_fuel_reports(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    company_id: int,
+) -> StreamingResponse:
+    db_company = await get_from_qs_or_404(session, get_queryset(request_user), company_id)
+    qs = Vehicle.for_user(request_user).filter_by(company_id=db_company.id).order_by(Vehicle.id)
+    jobs = await get_fuel_report_jobs(session, (await session.exec(qs)).all())
+    headers = {"Content-Disposition": f'attachment; filename="company_{db_company.id}_fuel_reports.zip"'}
+    return StreamingResponse(stream_fuel_reports(jobs), media_type="application/zip", headers=headers)
 
 
 @router.put("/{company_id}/")
@@ -60,11 +79,11 @@ async def update_company(
     company: CompanyCreate,
 ) -> CompanyRead:
     qs = get_queryset(request_user)
-    db_company = get_from_qs_or_404(session, qs, company_id)
+    db_company = await get_from_qs_or_404(session, qs, company_id)
     db_company.sqlmodel_update(company)
-    session.commit()
-    session.refresh(db_company)
-    return db_company
+    await session.commit()
+    await session.refresh(db_company)
+    return render(await serialize(session, CompanyRead, db_company))
 
 
 @router.delete("/{company_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -75,7 +94,8 @@ async def delete_company(
     response: Response,
 ) -> None:
     qs = get_queryset(request_user)
-    db_company = get_from_qs_or_404(session, qs, company_id)
-    session.delete(db_company)
-    session.commit()
+    db_company = await get_from_qs_or_404(session, qs, company_id)
+    await session.delete(db_company)
+    await session.commit()
+    token_cache.clear()
     response.status_code = status.HTTP_204_NO_CONTENT
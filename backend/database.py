@@ -1,16 +1,156 @@
 import logging
 import os
 import subprocess
+import time
 
+from fastapi import Request
+from sqlalchemy import DDL, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 logger = logging.getLogger("uvicorn.critical")
 
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "postgresql+psycopg2": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "0"))
+DB_IDLE_IN_TRANSACTION_TIMEOUT = int(os.getenv("DB_IDLE_IN_TRANSACTION_TIMEOUT", "0"))
+READ_ONLY_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class PoolWaitStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        self.checkouts += 1
+        self.timeouts += timed_out
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+
+def get_async_db_url(db_url: str) -> str:
+    if async_db_url := os.getenv("ASYNC_DB_URL"):
+        return async_db_url
+    url = make_url(db_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername)).render_as_string(hide_password=False)
+
+
+def get_server_settings() -> dict[str, str]:
+    settings = {}
+    if DB_STATEMENT_TIMEOUT:
+        settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT)
+    if DB_IDLE_IN_TRANSACTION_TIMEOUT:
+        settings["idle_in_transaction_session_timeout"] = str(DB_IDLE_IN_TRANSACTION_TIMEOUT)
+    return settings
+
+
+def get_connect_args(db_url: str) -> dict:
+    url = make_url(db_url)
+    if url.get_backend_name() != "postgresql" or not (server_settings := get_server_settings()):
+        return {}
+    if url.get_driver_name() == "asyncpg":
+        return {"server_settings": server_settings}
+    return {"options": " ".join(f"-c {key}={val}" for key, val in server_settings.items())}
+
+
+def get_engine_options(db_url: str) -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": get_connect_args(db_url),
+    }
+
+
 DB_URL = os.getenv("DB_URL")
-engine = create_engine(DB_URL)
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL")
+ASYNC_DB_URL = get_async_db_url(DB_URL)
+engine = create_engine(DB_URL, **get_engine_options(DB_URL))
+async_engine = create_async_engine(ASYNC_DB_URL, poolclass=InstrumentedQueuePool, **get_engine_options(ASYNC_DB_URL))
+async_replica_engine = async_engine
+if DB_REPLICA_URL:
+    ASYNC_DB_REPLICA_URL = get_async_db_url(DB_REPLICA_URL)
+    async_replica_engine = create_async_engine(ASYNC_DB_REPLICA_URL, poolclass=InstrumentedQueuePool, **get_engine_options(ASYNC_DB_REPLICA_URL))
 logger.info("Database engine created")
 
 
+class RoutingSession(Session):
+    use_primary = True
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.use_primary = True
+        if self.use_primary:
+            return async_engine.sync_engine
+        return async_replica_engine.sync_engine
+
+
+async_session_maker = async_sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False)
+
+
+def get_engines() -> dict[str, AsyncEngine]:
+    engines = {"primary": async_engine}
+    if async_replica_engine is not async_engine:
+        engines["replica"] = async_replica_engine
+    return engines
+
+
+def get_pool_status(name: str, db_engine: AsyncEngine) -> dict:
+    pool = db_engine.pool
+    wait_stats = pool.wait_stats
+    return {
+        "name": name,
+        "size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": wait_stats.checkouts,
+        "timeouts": wait_stats.timeouts,
+        "wait_total": wait_stats.wait_total,
+        "wait_max": wait_stats.wait_max,
+    }
+
+
+event.listen(SQLModel.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+
 def create_db_and_tables():
     logger.info(f"Database models creation started")
     SQLModel.metadata.create_all(engine)
@@ -23,8 +163,16 @@ def run_migrations():
     logger.info("Migrations complete")
 
 
-def get_session():
-    with Session(engine) as session:
+async def dispose_engines():
+    for db_engine in get_engines().values():
+        await db_engine.dispose()
+    engine.dispose()
+    logger.info("Database engines disposed")
+
+
+async def get_session(request: Request):
+    async with async_session_maker() as session:
+        session.sync_session.use_primary = request.method not in READ_ONLY_METHODS
         logger.debug("Session opened")
         yield session
         logger.debug("Session closed")
@@ -1,29 +1,56 @@
 import os
 from typing import Annotated
 
-from commons import get_user, raise_auth_error
+from commons import Fieldset, get_user, raise_auth_error
 from database import get_session
-from fastapi import Cookie, Depends, HTTPException, status
+from fastapi import Cookie, Depends, HTTPException, Query, status
 from jose import JWTError, jwt
-from sqlmodel import Session
+from monitoring.timing import set_request_user
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel.ext.asyncio.session import AsyncSession
 from users.models import User
+from users.utils import token_cache
 
+SECRET_KEY = os.getenv("SECRET_KEY")
 
-def authenticate_user(session: "SessionDep", token: str | None = Cookie(None)) -> User:
+
+async def authenticate_user(session: "SessionDep", token: str | None = Cookie(None)) -> User:
     if not token:
         raise raise_auth_error()
 
+    if cached := token_cache.get(token):
+        user = User(**cached[1])
+        make_transient_to_detached(user)
+        set_request_user(user.id, user.role.value, user.company_id)
+        return user
+
     try:
-        payload = jwt.decode(token, os.getenv("SECRET_KEY"))
+        payload = jwt.decode(token, SECRET_KEY)
     except JWTError:
         raise raise_auth_error()
 
     if email := payload.get("sub"):
-        if user := get_user(session, email):
+        if user := await get_user(session, email):
+            token_cache.set(token, payload, user.model_dump())
+            set_request_user(user.id, user.role.value, user.company_id)
             return user
 
     raise raise_auth_error()
 
 
-SessionDep = Annotated[Session, Depends(get_session)]
+def split_names(names: str | None) -> set[str] | None:
+    if names is None:
+        return None
+    return {name.strip() for name in names.split(",") if name.strip()}
+
+
+def get_fieldset(
+    fields: str = Query(None, description="Comma separated fields to return, relations are left out unless expanded"),
+    expand: str = Query(None, description="Comma separated relations to include"),
+) -> Fieldset:
+    return Fieldset(fields=split_names(fields), expand=split_names(expand) or set())
+
+
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
 LoginReqDep = Annotated[User, Depends(authenticate_user)]
+FieldsetDep = Annotated[Fieldset, Depends(get_fieldset)]
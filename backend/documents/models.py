@@ -3,11 +3,12 @@ from enum import Enum
 from typing import TYPE_CHECKING, Optional, Union
 
 from database import SQLModel
+from search.utils import get_search_rank
 from sqlalchemy import or_
-from sqlalchemy.sql import Select
+from sqlalchemy.sql import ColumnElement, Select
 from sqlmodel import Column
 from sqlmodel import Enum as EnumSQL
-from sqlmodel import Field, Relationship, select
+from sqlmodel import Field, Index, Relationship, select
 
 if TYPE_CHECKING:
     from events.models import Event, EventNestedRead
@@ -38,6 +39,13 @@ class DocumentBase(SQLModel):
 
 class Document(DocumentBase, table=True):
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_vehicle_id", "vehicle_id"),
+        Index("ix_documents_user_id", "user_id"),
+        Index("ix_documents_file_type", "file_type"),
+        Index("ix_documents_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        Index("ix_documents_description_trgm", "description", postgresql_using="gin", postgresql_ops={"description": "gin_trgm_ops"}),
+    )
     id: Optional[int] = Field(primary_key=True, default=None)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -65,9 +73,21 @@ class Document(DocumentBase, table=True):
         qs = qs.join(Vehicle, cls.vehicle_id == Vehicle.id)
         qs = qs.join(User, cls.user_id == User.id)
 
-        return qs.where(
+        qs = qs.where(
             or_(cls.title.ilike(search_pattern), cls.description.ilike(search_pattern), Vehicle.registration_number.ilike(search_pattern), User.name.ilike(search_pattern))
         )
+        return qs.order_by(None).order_by(cls.search_rank(search).desc(), cls.id.desc())
+
+    @classmethod
+    def search_rank(cls, search_term: str) -> ColumnElement[float]:
+        from users.models import User
+        from vehicles.models import Vehicle
+
+        return get_search_rank(search_term, cls.title, cls.description, Vehicle.registration_number, User.name)
+
+    @classmethod
+    def search_label(cls) -> ColumnElement[str]:
+        return cls.title
 
     @classmethod
     def with_type(cls, qs: Select["Document"], document_type: Optional[str]) -> Select["Document"]:
@@ -1,9 +1,11 @@
 import os
+import time
 import uuid
 from pathlib import Path
 from typing import Optional, Tuple
 
 from fastapi import UploadFile
+from monitoring.metrics import UPLOAD_BYTES, UPLOAD_DURATION
 
 
 class FileStorageError(Exception):
@@ -76,6 +78,7 @@ class DocumentFileManager:
         Raises:
             FileStorageError: If file storage fails
         """
+        started = time.perf_counter()
         try:
             self.validate_file(file)
 
@@ -91,6 +94,8 @@ class DocumentFileManager:
             with open(file_path, "wb") as f:
                 f.write(file_content)
 
+            UPLOAD_BYTES.observe(file_size)
+            UPLOAD_DURATION.observe(time.perf_counter() - started)
             return str(file_path), file_size
 
         except Exception as e:
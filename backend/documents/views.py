@@ -1,12 +1,10 @@
 import os
 from typing import Optional
 
-from commons import get_filters, get_from_qs_or_404, validate_obj_reference
-from dependencies import LoginReqDep, SessionDep
+from commons import LargePage, get_filters, get_from_qs_or_404, paginate, render, serialize, validate_obj_reference, with_load_options
+from dependencies import FieldsetDep, LoginReqDep, SessionDep
 from fastapi import APIRouter, File, Form, HTTPException, Query, Response, UploadFile, status
 from fastapi.responses import FileResponse
-from fastapi_pagination import Page
-from fastapi_pagination.ext.sqlalchemy import paginate
 from sqlalchemy.sql import Select
 from users.models import User
 from vehicles.models import Vehicle
@@ -26,22 +24,22 @@ def get_queryset(request_user: User) -> Select[Document]:
 async def list_documents(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     search: str = Query(None, description="Search by document title, description, vehicle plates, or user name"),
     document_type: str = Query(None, description="Filter by document type"),
-) -> Page[DocumentRead]:
+) -> LargePage[DocumentRead]:
     filters = get_filters({})
     qs = get_queryset(request_user).filter_by(**filters)
     qs = Document.with_search(qs, search)
     qs = Document.with_type(qs, document_type)
 
-    return paginate(session, qs)
+    return await paginate(session, qs, DocumentRead, fieldset)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_document(
     session: SessionDep,
     request_user: LoginReqDep,
-    response: Response,
     title: str = Form(...),
     description: str = Form(default=""),
     file_type: str = Form(...),
@@ -59,8 +57,8 @@ async def create_document(
         title=title, description=description, file_type=file_type, vehicle_id=vehicle_id, user_id=user_id, file=file_content, filename=original_filename
     )
 
-    validate_obj_reference(session, document_form, Vehicle, document_form.vehicle_id)
-    validate_obj_reference(session, document_form, User, document_form.user_id)
+    await validate_obj_reference(session, document_form, Vehicle, document_form.vehicle_id)
+    await validate_obj_reference(session, document_form, User, document_form.user_id)
 
     file_path, file_size = None, None
     if file and file.filename:
@@ -78,21 +76,22 @@ async def create_document(
     db_document.file_size = file_size
 
     session.add(db_document)
-    session.commit()
-    session.refresh(db_document)
+    await session.commit()
+    await session.refresh(db_document)
 
-    response.status_code = status.HTTP_201_CREATED
-    return db_document
+    return render(await serialize(session, DocumentRead, db_document), status.HTTP_201_CREATED)
 
 
 @router.get("/{document_id}/")
 async def retrive_document(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     document_id: int,
 ) -> DocumentRead:
-    qs = get_queryset(request_user)
-    return get_from_qs_or_404(session, qs, document_id)
+    qs = with_load_options(get_queryset(request_user), DocumentRead, fieldset)
+    db_document = await get_from_qs_or_404(session, qs, document_id)
+    return render(await serialize(session, DocumentRead, db_document, fieldset))
 
 
 @router.put("/{document_id}/")
@@ -108,12 +107,12 @@ async def update_document(
     file: Optional[UploadFile] = File(None),
 ) -> DocumentRead:
     qs = get_queryset(request_user)
-    db_document = get_from_qs_or_404(session, qs, document_id)
+    db_document = await get_from_qs_or_404(session, qs, document_id)
 
     if vehicle_id:
-        validate_obj_reference(session, {"vehicle_id": vehicle_id}, Vehicle, vehicle_id)
+        await validate_obj_reference(session, {"vehicle_id": vehicle_id}, Vehicle, vehicle_id)
     if user_id:
-        validate_obj_reference(session, {"user_id": user_id}, User, user_id)
+        await validate_obj_reference(session, {"user_id": user_id}, User, user_id)
 
     if file and file.filename:
         if db_document.file_path and document_file_manager.file_exists(db_document.file_path):
@@ -137,9 +136,9 @@ async def update_document(
     if user_id is not None:
         db_document.user_id = user_id
 
-    session.commit()
-    session.refresh(db_document)
-    return db_document
+    await session.commit()
+    await session.refresh(db_document)
+    return render(await serialize(session, DocumentRead, db_document))
 
 
 @router.delete("/{document_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -150,13 +149,13 @@ async def delete_document(
     response: Response,
 ) -> None:
     qs = get_queryset(request_user)
-    db_document = get_from_qs_or_404(session, qs, document_id)
+    db_document = await get_from_qs_or_404(session, qs, document_id)
 
     if db_document.file_path:
         document_file_manager.delete_file(db_document.file_path)
 
-    session.delete(db_document)
-    session.commit()
+    await session.delete(db_document)
+    await session.commit()
     response.status_code = status.HTTP_204_NO_CONTENT
 
 
@@ -167,7 +166,7 @@ async def download_document_file(
     document_id: int,
 ) -> FileResponse:
     qs = get_queryset(request_user)
-    db_document = get_from_qs_or_404(session, qs, document_id)
+    db_document = await get_from_qs_or_404(session, qs, document_id)
 
     if not db_document.file_path or not document_file_manager.file_exists(db_document.file_path):
         raise HTTPException(status_code=404, detail="File not found")
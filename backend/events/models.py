@@ -3,7 +3,7 @@ from typing import TYPE_CHECKING
 
 from database import SQLModel
 from sqlalchemy.sql import Select
-from sqlmodel import Field, Relationship, select
+from sqlmodel import Field, Index, Relationship, select
 
 if TYPE_CHECKING:
     from companies.models import Company, CompanyNestedRead
@@ -24,6 +24,11 @@ class EventBase(SQLModel):
 
 class Event(EventBase, table=True):
     __tablename__ = "events"
+    __table_args__ = (
+        Index("ix_events_vehicle_id_date", "vehicle_id", "date"),
+        Index("ix_events_company_id_date", "company_id", "date"),
+        Index("ix_events_document_id", "document_id"),
+    )
     id: int | None = Field(primary_key=True, default=None)
     vehicle: "Vehicle" = Relationship(back_populates="events")
     document: "Document" = Relationship(back_populates="events")
@@ -47,3 +52,7 @@ class EventNestedRead(EventBase):
 
 class EventCreate(EventBase):
     pass
+
+
+class EventBatchUpdate(EventCreate):
+    id: int
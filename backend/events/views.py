@@ -1,13 +1,16 @@
-from commons import Page, get_filters, get_from_qs_or_404, validate_obj_reference
+from batches import BATCH_MAX_SIZE, BatchResult, create_batch, delete_batch, update_batch
+from commons import Page, get_filters, get_from_qs_or_404, paginate, render, serialize, validate_obj_reference, with_load_options
 from companies.models import Company
-from dependencies import LoginReqDep, SessionDep
+from dependencies import FieldsetDep, LoginReqDep, SessionDep
 from documents.models import Document
-from fastapi import APIRouter, Query, Response, status
-from fastapi_pagination.ext.sqlalchemy import paginate
+from exports import ExportFormat, export
+from fastapi import APIRouter, Body, File, Query, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from imports import ImportFormat, ImportReport, import_rows
 from sqlalchemy.sql import Select
 from users.models import User
 
-from .models import Event, EventCreate, EventRead
+from .models import Event, EventBatchUpdate, EventCreate, EventRead
 
 router = APIRouter(prefix="/events", tags=["events"])
 
@@ -16,17 +19,70 @@ def get_queryset(request_user: User) -> Select[Event]:
     return Event.for_user(request_user)
 
 
+def get_list_queryset(request_user: User, vehicle_id: int | None = None, document_id: int | None = None, company_id: int | None = None) -> Select[Event]:
+    filters = get_filters({"vehicle_id": vehicle_id, "document_id": document_id, "company_id": company_id})
+    return get_queryset(request_user).filter_by(**filters)
+
+
 @router.get("/")
 async def list_events(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     vehicle_id: int = Query(None),
     document_id: int = Query(None),
     company_id: int = Query(None),
 ) -> Page[EventRead]:
-    filters = get_filters({"vehicle_id": vehicle_id, "document_id": document_id, "company_id": company_id})
-    qs = get_queryset(request_user).filter_by(**filters)
-    return paginate(session, qs)
+    qs = get_list_queryset(request_user, vehicle_id, document_id, company_id)
+    return await paginate(session, qs, EventRead, fieldset)
+
+
+@router.get("/export/")
+async def export_events(
+    request_user: LoginReqDep,
+    vehicle_id: int = Query(None),
+    document_id: int = Query(None),
+    company_id: int = Query(None),
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+) -> StreamingResponse:
+    return export(get_list_queryset(request_user, vehicle_id, document_id, company_id), export_format, "events")
+
+
+@router.post("/import/")
+async def import_events(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    file: UploadFile = File(...),
+    import_format: ImportFormat = Query(ImportFormat.CSV, alias="format"),
+) -> ImportReport:
+    return await import_rows(session, request_user, file, import_format, Event, EventCreate)
+
+
+@router.post("/batch/")
+async def create_events(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    events: list[EventCreate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await create_batch(session, request_user, Event, events)
+
+
+@router.put("/batch/")
+async def update_events(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    events: list[EventBatchUpdate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await update_batch(session, request_user, get_queryset(request_user), Event, events)
+
+
+@router.delete("/batch/")
+async def delete_events(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    ids: list[int] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await delete_batch(session, get_queryset(request_user), Event, ids)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -34,27 +90,27 @@ async def create_event(
     session: SessionDep,
     request_user: LoginReqDep,
     event: EventCreate,
-    response: Response,
 ) -> EventRead:
-    validate_obj_reference(session, event, Document, event.document_id)
-    validate_obj_reference(session, event, Company, event.company_id)
+    await validate_obj_reference(session, event, Document, event.document_id)
+    await validate_obj_reference(session, event, Company, event.company_id)
 
     db_event = Event.model_validate(event)
     session.add(db_event)
-    session.commit()
-    session.refresh(db_event)
-    response.status_code = status.HTTP_201_CREATED
-    return db_event
+    await session.commit()
+    await session.refresh(db_event)
+    return render(await serialize(session, EventRead, db_event), status.HTTP_201_CREATED)
 
 
 @router.get("/{event_id}/")
 async def retrive_event(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     event_id: int,
 ) -> EventRead:
-    qs = get_queryset(request_user)
-    return get_from_qs_or_404(session, qs, event_id)
+    qs = with_load_options(get_queryset(request_user), EventRead, fieldset)
+    db_event = await get_from_qs_or_404(session, qs, event_id)
+    return render(await serialize(session, EventRead, db_event, fieldset))
 
 
 @router.put("/{event_id}/")
@@ -64,15 +120,15 @@ async def update_event(
     event_id: int,
     event: EventCreate,
 ) -> EventRead:
-    validate_obj_reference(session, event, Document, event.document_id)
-    validate_obj_reference(session, event, Company, event.company_id)
+    await validate_obj_reference(session, event, Document, event.document_id)
+    await validate_obj_reference(session, event, Company, event.company_id)
 
     qs = get_queryset(request_user)
-    db_event = get_from_qs_or_404(session, qs, event_id)
+    db_event = await get_from_qs_or_404(session, qs, event_id)
     db_event.sqlmodel_update(event)
-    session.commit()
-    session.refresh(db_event)
-    return db_event
+    await session.commit()
+    await session.refresh(db_event)
+    return render(await serialize(session, EventRead, db_event))
 
 
 @router.delete("/{event_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -83,7 +139,7 @@ async def delete_event(
     response: Response,
 ) -> None:
     qs = get_queryset(request_user)
-    db_event = get_from_qs_or_404(session, qs, event_id)
-    session.delete(db_event)
-    session.commit()
+    db_event = await get_from_qs_or_404(session, qs, event_id)
+    await session.delete(db_event)
+    await session.commit()
     response.status_code = status.HTTP_204_NO_CONTENT
@@ -0,0 +1,104 @@
+import csv
+import io
+import os
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Sequence
+
+import pyarrow
+import pyarrow.parquet
+from commons import StreamBuffer
+from database import async_session_maker
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Column
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import Select
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+
+
+ARROW_TYPES = {bool: pyarrow.bool_(), int: pyarrow.int64(), float: pyarrow.float64(), datetime: pyarrow.timestamp("us"), date: pyarrow.date32()}
+
+
+def get_arrow_type(column: Column) -> pyarrow.DataType:
+    try:
+        return ARROW_TYPES.get(column.type.python_type, pyarrow.string())
+    except NotImplementedError:
+        return pyarrow.string()
+
+
+def get_export_value(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else value
+
+
+class CSVExportWriter:
+    media_type = "text/csv"
+
+    def __init__(self, columns: Sequence[Column]):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.writer.writerow([column.name for column in columns])
+
+    def pop(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data.encode()
+
+    def write(self, rows: Sequence[Row]) -> bytes:
+        self.writer.writerows([value.isoformat() if isinstance(value, date) else get_export_value(value) for value in row] for row in rows)
+        return self.pop()
+
+    def close(self) -> bytes:
+        return self.pop()
+
+
+class ParquetExportWriter:
+    media_type = "application/vnd.apache.parquet"
+
+    def __init__(self, columns: Sequence[Column]):
+        self.schema = pyarrow.schema([(column.name, get_arrow_type(column)) for column in columns])
+        self.stream = StreamBuffer()
+        self.writer = pyarrow.parquet.ParquetWriter(self.stream, self.schema)
+
+    def write(self, rows: Sequence[Row]) -> bytes:
+        arrays = [pyarrow.array([get_export_value(value) for value in column], type=field.type) for column, field in zip(zip(*rows), self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        return self.stream.pop()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.stream.pop()
+
+
+EXPORT_WRITERS = {ExportFormat.CSV: CSVExportWriter, ExportFormat.PARQUET: ParquetExportWriter}
+
+
+def get_export_query(qs: Select) -> Select:
+    model = qs.column_descriptions[0]["entity"]
+    qs = qs.with_only_columns(*model.__table__.columns)
+    if not qs._order_by_clauses:
+        qs = qs.order_by(model.id)
+    return qs
+
+
+async def stream_export(qs: Select, writer: CSVExportWriter | ParquetExportWriter) -> AsyncIterator[bytes]:
+    async with async_session_maker() as session:
+        session.sync_session.use_primary = False
+        result = await session.stream(qs.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield await run_in_threadpool(writer.write, rows)
+    yield writer.close()
+
+
+def export(qs: Select, export_format: ExportFormat, filename: str) -> StreamingResponse:
+    qs = get_export_query(qs)
+    writer = EXPORT_WRITERS[export_format](qs.selected_columns)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"'}
+    return StreamingResponse(stream_export(qs, writer), media_type=writer.media_type, headers=headers)
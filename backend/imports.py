@@ -0,0 +1,163 @@
+import csv
+import io
+import os
+from enum import Enum
+from functools import cache
+from typing import IO, Callable, Iterator, Type
+
+import orjson
+from commons import raise_validation_error
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Column, Integer, MetaData, String, Table, cast, delete, exists, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql import ColumnElement
+from sqlmodel import Enum as EnumSQL
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from users.models import User
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+ImportCheck = Callable[[Table, User], list[tuple[ColumnElement[bool], str]]]
+
+
+class ImportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class ImportRejection(BaseModel):
+    row: int
+    errors: list[str]
+
+
+class ImportReport(BaseModel):
+    total: int
+    imported: int
+    rejected: list[ImportRejection]
+
+
+@cache
+def get_staging_table(model: Type[SQLModel]) -> Table:
+    columns = [Column(column.name, String() if isinstance(column.type, EnumSQL) else column.type) for column in model.__table__.columns if not column.primary_key]
+    return Table(f"import_{model.__tablename__}", MetaData(), Column("row_number", Integer, primary_key=True), *columns, prefixes=["TEMPORARY"])
+
+
+def get_staging_value(value: object) -> object:
+    return value.name if isinstance(value, Enum) else value
+
+
+def get_error_reason(error: dict) -> str:
+    field = ".".join(str(loc) for loc in error["loc"])
+    return f"{field}: {error['msg']}" if field else error["msg"]
+
+
+def read_records(file: IO[bytes], import_format: ImportFormat) -> Iterator[dict | None]:
+    if import_format == ImportFormat.CSV:
+        for record in csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline="")):
+            yield {key: value for key, value in record.items() if key is not None and value != ""}
+        return
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError:
+            yield None
+
+
+def read_batches(file: IO[bytes], import_format: ImportFormat, create_model: Type[SQLModel], fields: list[str]) -> Iterator[tuple[list[dict], list[ImportRejection]]]:
+    records, rejected = [], []
+    for row, record in enumerate(read_records(file, import_format), start=1):
+        try:
+            if record is None:
+                rejected.append(ImportRejection(row=row, errors=["Invalid JSON."]))
+            else:
+                obj = create_model.model_validate(record)
+                records.append({"row_number": row, **{name: get_staging_value(getattr(obj, name)) for name in fields}})
+        except ValidationError as e:
+            rejected.append(ImportRejection(row=row, errors=[get_error_reason(error) for error in e.errors()]))
+        if len(records) + len(rejected) >= IMPORT_BATCH_SIZE:
+            yield records, rejected
+            records, rejected = [], []
+    yield records, rejected
+
+
+async def copy_to_staging(connection: AsyncConnection, staging: Table, records: list[dict]) -> None:
+    if connection.dialect.driver != "asyncpg":
+        await connection.execute(insert(staging), records)
+        return
+    columns = [column.name for column in staging.columns]
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(staging.name, records=[tuple(record[name] for name in columns) for record in records], columns=columns)
+
+
+def check_references(staging: Table, model: Type[SQLModel]) -> list[tuple[ColumnElement[bool], str]]:
+    checks = []
+    for foreign_key in model.__table__.foreign_keys:
+        column = staging.c[foreign_key.parent.name]
+        checks.append((column.is_not(None) & ~exists().where(foreign_key.column == column), f"The specified {column.name.removesuffix('_id')} does not exist."))
+    return checks
+
+
+def check_user_reference(staging: Table, request_user: User) -> list[tuple[ColumnElement[bool], str]]:
+    if request_user.is_worker:
+        return [(staging.c.user_id.is_not(None) & (staging.c.user_id != request_user.id), "Insufficient permissions")]
+    if request_user.is_manager:
+        company_users = select(User.id).where(User.company_id == request_user.company_id)
+        return [(staging.c.user_id.is_not(None) & staging.c.user_id.not_in(company_users), "Insufficient permissions")]
+    return []
+
+
+def check_company_reference(staging: Table, request_user: User) -> list[tuple[ColumnElement[bool], str]]:
+    if request_user.is_worker or request_user.is_manager:
+        return [(staging.c.company_id.is_not(None) & (staging.c.company_id != request_user.company_id), "Insufficient permissions")]
+    return []
+
+
+async def import_rows(
+    session: AsyncSession,
+    request_user: User,
+    file: UploadFile,
+    import_format: ImportFormat,
+    model: Type[SQLModel],
+    create_model: Type[SQLModel],
+    checks: tuple[ImportCheck, ...] = (),
+) -> ImportReport:
+    staging = get_staging_table(model)
+    fields = [column.name for column in staging.columns if column.name != "row_number"]
+    connection = await session.connection()
+    await connection.run_sync(staging.drop, checkfirst=True)
+    await connection.run_sync(staging.create)
+
+    total, rejected = 0, []
+    batches = read_batches(file.file, import_format, create_model, fields)
+    try:
+        while (batch := await run_in_threadpool(next, batches, None)) is not None:
+            records, batch_rejected = batch
+            total += len(records) + len(batch_rejected)
+            rejected += batch_rejected
+            if records:
+                await copy_to_staging(connection, staging, records)
+    except UnicodeDecodeError:
+        await session.rollback()
+        raise_validation_error("The import file must be UTF-8 encoded.", {"filename": file.filename})
+
+    conditions = check_references(staging, model) + [condition for check in checks for condition in check(staging, request_user)]
+    rejected_rows: dict[int, list[str]] = {}
+    for condition, reason in conditions:
+        for row in (await connection.execute(select(staging.c.row_number).where(condition))).scalars():
+            rejected_rows.setdefault(row, []).append(reason)
+    if rejected_rows:
+        await connection.execute(delete(staging).where(or_(*(condition for condition, _ in conditions))))
+
+    columns = [model.__table__.c[name] for name in fields]
+    values = select(*(cast(staging.c[column.name], column.type) if isinstance(column.type, EnumSQL) else staging.c[column.name] for column in columns))
+    result = await connection.execute(insert(model.__table__).from_select(fields, values.order_by(staging.c.row_number)))
+    await connection.run_sync(staging.drop)
+    await session.commit()
+
+    rejected += [ImportRejection(row=row, errors=errors) for row, errors in rejected_rows.items()]
+    return ImportReport(total=total, imported=result.rowcount, rejected=sorted(rejected, key=lambda rejection: rejection.row))
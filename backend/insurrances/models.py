@@ -6,7 +6,7 @@ from database import SQLModel
 from sqlalchemy.sql import Select
 from sqlmodel import Column
 from sqlmodel import Enum as EnumSQL
-from sqlmodel import Field, Relationship, select
+from sqlmodel import Field, Index, Relationship, select
 
 if TYPE_CHECKING:
     from companies.models import Company, CompanyNestedRead
@@ -36,6 +36,12 @@ class InsurranceBase(SQLModel):
 
 class Insurrance(InsurranceBase, table=True):
     __tablename__ = "insurrances"
+    __table_args__ = (
+        Index("ix_insurrances_vehicle_id_date_to", "vehicle_id", "date_to"),
+        Index("ix_insurrances_company_id_date_to", "company_id", "date_to"),
+        Index("ix_insurrances_document_id", "document_id"),
+        Index("ix_insurrances_date_to", "date_to"),
+    )
     id: int | None = Field(primary_key=True, default=None)
     vehicle: "Vehicle" = Relationship(back_populates="insurrances")
     document: "Document" = Relationship(back_populates="insurrances")
@@ -43,10 +49,12 @@ class Insurrance(InsurranceBase, table=True):
 
     @classmethod
     def for_user(cls, user: "User") -> Select["Insurrance"]:
+        from scopes import get_scope
         from vehicles.models import Vehicle
 
-        if not user.is_admin:
-            return select(cls).join(Vehicle).filter(Vehicle.company_id == user.company_id)
+        scope = get_scope(user)
+        if not scope.is_admin:
+            return select(cls).filter(cls.vehicle_id.in_(select(Vehicle.id).where(Vehicle.company_id == scope.company_id)))
         return select(cls)
 
     @classmethod
@@ -69,3 +77,7 @@ class InsurranceNestedRead(InsurranceBase):
 
 class InsurranceCreate(InsurranceBase):
     pass
+
+
+class InsurranceBatchUpdate(InsurranceCreate):
+    id: int
@@ -1,14 +1,16 @@
-from commons import Page, get_filters, get_from_qs_or_404, validate_obj_reference
+from batches import BATCH_MAX_SIZE, BatchResult, create_batch, delete_batch, update_batch
+from commons import Page, get_filters, get_from_qs_or_404, paginate, render, serialize, validate_obj_reference, with_load_options
 from companies.models import Company
-from dependencies import LoginReqDep, SessionDep
+from dependencies import FieldsetDep, LoginReqDep, SessionDep
 from documents.models import Document
-from fastapi import APIRouter, Query, Response, status
-from fastapi_pagination.ext.sqlalchemy import paginate
+from exports import ExportFormat, export
+from fastapi import APIRouter, Body, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.sql import Select
 from users.models import User
 from vehicles.models import Vehicle
 
-from .models import Insurrance, InsurranceCreate, InsurranceRead
+from .models import Insurrance, InsurranceBatchUpdate, InsurranceCreate, InsurranceRead
 
 router = APIRouter(prefix="/insurrances", tags=["insurrances"])
 
@@ -17,27 +19,71 @@ def get_queryset(request_user: User) -> Select[Insurrance]:
     return Insurrance.for_user(request_user)
 
 
+def get_list_queryset(request_user: User, vehicle_id: int | None = None, document_id: int | None = None, company_id: int | None = None) -> Select[Insurrance]:
+    filters = get_filters({"vehicle_id": vehicle_id, "document_id": document_id, "company_id": company_id})
+    return get_queryset(request_user).filter_by(**filters)
+
+
 @router.get("/")
 async def list_insurrances(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     vehicle_id: int = Query(None),
     document_id: int = Query(None),
     company_id: int = Query(None),
 ) -> Page[InsurranceRead]:
-    filters = get_filters({"vehicle_id": vehicle_id, "document_id": document_id, "company_id": company_id})
-    qs = get_queryset(request_user).filter_by(**filters)
-    return paginate(session, qs)
+    qs = get_list_queryset(request_user, vehicle_id, document_id, company_id)
+    return await paginate(session, qs, InsurranceRead, fieldset)
+
+
+@router.get("/export/")
+async def export_insurrances(
+    request_user: LoginReqDep,
+    vehicle_id: int = Query(None),
+    document_id: int = Query(None),
+    company_id: int = Query(None),
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+) -> StreamingResponse:
+    return export(get_list_queryset(request_user, vehicle_id, document_id, company_id), export_format, "insurrances")
 
 
 @router.get("/finishing/", description="List insurrances that are finishing in the next 30 days")
 async def list_finishing(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
 ) -> Page[InsurranceRead]:
     qs = get_queryset(request_user)
     qs = Insurrance.finishing(qs)
-    return paginate(session, qs)
+    return await paginate(session, qs, InsurranceRead, fieldset)
+
+
+@router.post("/batch/")
+async def create_insurrances(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    insurrances: list[InsurranceCreate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await create_batch(session, request_user, Insurrance, insurrances)
+
+
+@router.put("/batch/")
+async def update_insurrances(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    insurrances: list[InsurranceBatchUpdate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await update_batch(session, request_user, get_queryset(request_user), Insurrance, insurrances)
+
+
+@router.delete("/batch/")
+async def delete_insurrances(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    ids: list[int] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await delete_batch(session, get_queryset(request_user), Insurrance, ids)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -45,28 +91,28 @@ async def create_insurrance(
     session: SessionDep,
     request_user: LoginReqDep,
     insurrance: InsurranceCreate,
-    response: Response,
 ) -> InsurranceRead:
-    validate_obj_reference(session, insurrance, Vehicle, insurrance.vehicle_id)
-    validate_obj_reference(session, insurrance, Document, insurrance.document_id)
-    validate_obj_reference(session, insurrance, Company, insurrance.company_id)
+    await validate_obj_reference(session, insurrance, Vehicle, insurrance.vehicle_id)
+    await validate_obj_reference(session, insurrance, Document, insurrance.document_id)
+    await validate_obj_reference(session, insurrance, Company, insurrance.company_id)
 
     db_insurrance = Insurrance.model_validate(insurrance)
     session.add(db_insurrance)
-    session.commit()
-    session.refresh(db_insurrance)
-    response.status_code = status.HTTP_201_CREATED
-    return db_insurrance
+    await session.commit()
+    await session.refresh(db_insurrance)
+    return render(await serialize(session, InsurranceRead, db_insurrance), status.HTTP_201_CREATED)
 
 
 @router.get("/{insurrance_id}/")
 async def retrive_insurrance(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     insurrance_id: int,
 ) -> InsurranceRead:
-    qs = get_queryset(request_user)
-    return get_from_qs_or_404(session, qs, insurrance_id)
+    qs = with_load_options(get_queryset(request_user), InsurranceRead, fieldset)
+    db_insurrance = await get_from_qs_or_404(session, qs, insurrance_id)
+    return render(await serialize(session, InsurranceRead, db_insurrance, fieldset))
 
 
 @router.put("/{insurrance_id}/")
@@ -76,16 +122,16 @@ async def update_insurrance(
     insurrance_id: int,
     insurrance: InsurranceCreate,
 ) -> InsurranceRead:
-    validate_obj_reference(session, insurrance, Vehicle, insurrance.vehicle_id)
-    validate_obj_reference(session, insurrance, Document, insurrance.document_id)
-    validate_obj_reference(session, insurrance, Company, insurrance.company_id)
+    await validate_obj_reference(session, insurrance, Vehicle, insurrance.vehicle_id)
+    await validate_obj_reference(session, insurrance, Document, insurrance.document_id)
+    await validate_obj_reference(session, insurrance, Company, insurrance.company_id)
 
     qs = get_queryset(request_user)
-    db_insurrance = get_from_qs_or_404(session, qs, insurrance_id)
+    db_insurrance = await get_from_qs_or_404(session, qs, insurrance_id)
     db_insurrance.sqlmodel_update(insurrance)
-    session.commit()
-    session.refresh(db_insurrance)
-    return db_insurrance
+    await session.commit()
+    await session.refresh(db_insurrance)
+    return render(await serialize(session, InsurranceRead, db_insurrance))
 
 
 @router.delete("/{insurrance_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -96,7 +142,7 @@ async def delete_insurrance(
     response: Response,
 ) -> None:
     qs = get_queryset(request_user)
-    db_insurrance = get_from_qs_or_404(session, qs, insurrance_id)
-    session.delete(db_insurrance)
-    session.commit()
+    db_insurrance = await get_from_qs_or_404(session, qs, insurrance_id)
+    await session.delete(db_insurrance)
+    await session.commit()
     response.status_code = status.HTTP_204_NO_CONTENT
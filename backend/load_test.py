@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+import orjson
+
+os.environ.setdefault("DB_URL", "postgresql://localhost/fleetflow")
+
+from seed_scale_data import COMPANIES_PER_SCALE
+
+PASSWORD = "FleetFlow1!"
+SEARCH_TERMS = ["ford", "transit", "smith", "sprinter", "volvo", "ID0000", "receipts", "john", "shell", "WA"]
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.recording = False
+
+    def record(self, route: str, duration: float, ok: bool) -> None:
+        if not self.recording:
+            return
+        self.latencies[route].append(duration)
+        if not ok:
+            self.errors[route] += 1
+
+    def summary(self, elapsed: float) -> dict[str, dict]:
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            routes[route] = {
+                "requests": len(latencies),
+                "errors": self.errors[route],
+                "throughput": len(latencies) / elapsed,
+                **{f"p{percentile}": latencies[min(len(latencies) - 1, len(latencies) * percentile // 100)] * 1000 for percentile in PERCENTILES},
+                "max": latencies[-1] * 1000,
+            }
+        return routes
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, rng: random.Random, email: str):
+        self.client = client
+        self.stats = stats
+        self.rng = rng
+        self.email = email
+        self.role = email.split("@")[0].rstrip("0123456789")
+        self.vehicle_ids = []
+
+    async def request(self, method: str, route: str, url: str, **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            await response.aread()
+        except httpx.HTTPError:
+            self.stats.record(route, time.perf_counter() - started, False)
+            return None
+        self.stats.record(route, time.perf_counter() - started, response.is_success)
+        return response
+
+    def vehicle_id(self) -> int | None:
+        return self.rng.choice(self.vehicle_ids) if self.vehicle_ids else None
+
+    async def login(self) -> bool:
+        response = await self.request("POST", "POST /users/login/", "/users/login/", json={"email": self.email, "password": PASSWORD})
+        return response is not None and response.is_success
+
+    async def dashboard(self) -> None:
+        await self.request("GET", "GET /users/me/", "/users/me/")
+        response = await self.request("GET", "GET /vehicles/", "/vehicles/")
+        if response is not None and response.is_success:
+            self.vehicle_ids = [vehicle["id"] for vehicle in response.json()["items"]]
+
+    async def reports_page(self) -> None:
+        await self.request("GET", "GET /refuels/stats/", "/refuels/stats/")
+        await self.request("GET", "GET /vehicles/", "/vehicles/", params={"page": 1, "size": 15})
+        await self.request("GET", "GET /vehicles/", "/vehicles/", params={"page": 1, "size": 1})
+        await self.request("GET", "GET /refuels/", "/refuels/")
+        await self.request("GET", "GET /reservations/", "/reservations/")
+        await self.request("GET", "GET /users/", "/users/")
+
+    async def fuel_report(self) -> None:
+        if (vehicle_id := self.vehicle_id()) is not None:
+            await self.request("GET", "GET /vehicles/{id}/reports/fuel/", f"/vehicles/{vehicle_id}/reports/fuel/")
+
+    async def vehicle_search(self) -> None:
+        term = self.rng.choice(SEARCH_TERMS)
+        for length in range(3, len(term) + 1, 2):
+            await self.request("GET", "GET /vehicles/?search=", "/vehicles/", params={"page": 1, "size": 15, "search": term[:length]})
+
+    async def global_search(self) -> None:
+        await self.request("GET", "GET /search/", "/search/", params={"q": self.rng.choice(SEARCH_TERMS)})
+
+    async def vehicle_details(self) -> None:
+        if (vehicle_id := self.vehicle_id()) is None:
+            return
+        await self.request("GET", "GET /vehicles/{id}/", f"/vehicles/{vehicle_id}/")
+        await self.request("GET", "GET /refuels/?vehicle_id=", "/refuels/", params={"vehicle_id": vehicle_id})
+        await self.request("GET", "GET /events/?vehicle_id=", "/events/", params={"vehicle_id": vehicle_id})
+        await self.request("GET", "GET /insurrances/?vehicle_id=", "/insurrances/", params={"vehicle_id": vehicle_id})
+
+    async def relogin(self) -> None:
+        if await self.login():
+            await self.dashboard()
+
+
+# flow, weight, roles allowed to run it
+FLOWS = [
+    (VirtualUser.dashboard, 20, ("admin", "manager", "worker")),
+    (VirtualUser.reports_page, 20, ("admin", "manager", "worker")),
+    (VirtualUser.vehicle_details, 25, ("admin", "manager", "worker")),
+    (VirtualUser.vehicle_search, 15, ("admin", "manager", "worker")),
+    (VirtualUser.global_search, 10, ("admin", "manager", "worker")),
+    (VirtualUser.fuel_report, 5, ("admin", "manager")),
+    (VirtualUser.relogin, 5, ("admin", "manager", "worker")),
+]
+
+
+def get_emails(rng: random.Random, scale: float, users: int) -> list[str]:
+    companies = max(1, round(COMPANIES_PER_SCALE * scale))
+    emails = []
+    for _ in range(users):
+        company = rng.randint(1, companies)
+        emails.append(f"{'manager' if rng.random() < 0.3 else 'worker'}1@company{company}.example.com")
+    return emails
+
+
+async def run_user(user: VirtualUser, deadline: float, think_time: float) -> None:
+    if not await user.login():
+        return
+    await user.dashboard()
+    flows, weights = zip(*((flow, weight) for flow, weight, roles in FLOWS if user.role in roles))
+    while time.monotonic() < deadline:
+        await user.rng.choices(flows, weights)[0](user)
+        if think_time:
+            await asyncio.sleep(user.rng.expovariate(1 / think_time))
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    stats = Stats()
+    emails = (["admin@example.com"] if args.admins else []) + get_emails(rng, args.scale, args.users - (1 if args.admins else 0))
+    clients = [httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) for _ in emails]
+    users = [VirtualUser(client, stats, random.Random(rng.random()), email) for client, email in zip(clients, emails)]
+
+    started = time.monotonic()
+    deadline = started + args.warmup + args.duration
+    tasks = [asyncio.create_task(run_user(user, deadline, args.think_time)) for user in users]
+    await asyncio.sleep(args.warmup)
+    stats.recording = True
+    measured_from = time.monotonic()
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - measured_from
+    for client in clients:
+        await client.aclose()
+
+    meta = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    return {"meta": {**meta, "started_at": datetime.now(timezone.utc).isoformat(), "elapsed": elapsed}, "routes": stats.summary(elapsed)}
+
+
+def print_results(results: dict, baseline: dict | None) -> None:
+    baseline_routes = baseline["routes"] if baseline else {}
+    print(f"{'route':<34} {'req':>7} {'err':>5} {'req/s':>8} " + " ".join(f"{f'p{percentile}':>8}" for percentile in PERCENTILES) + f" {'max':>8}")
+    for route, summary in results["routes"].items():
+        line = f"{route:<34} {summary['requests']:>7} {summary['errors']:>5} {summary['throughput']:>8.1f} "
+        line += " ".join(f"{summary[f'p{percentile}']:>8.1f}" for percentile in PERCENTILES) + f" {summary['max']:>8.1f}"
+        if previous := baseline_routes.get(route):
+            line += f"  p95 {(summary['p95'] / previous['p95'] - 1) * 100:+.0f}%, req/s {(summary['throughput'] / previous['throughput'] - 1) * 100:+.0f}%"
+        print(line)
+    total = sum(summary["requests"] for summary in results["routes"].values())
+    print(f"Total {total} requests in {results['meta']['elapsed']:.1f}s, {total / results['meta']['elapsed']:.1f} req/s")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay frontend page flows against a running backend seeded with seed_scale_data.py.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale factor the database was seeded with")
+    parser.add_argument("--users", type=int, default=20, help="number of concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds of load before measuring")
+    parser.add_argument("--think-time", type=float, default=0, help="mean pause between flows in seconds")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--admins", action="store_true", help="include the admin account among the virtual users")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results previously written with --output")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "rb") as f:
+            baseline = orjson.loads(f.read())
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    return 1 if any(summary["errors"] for summary in results["routes"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,17 +5,23 @@ from contextlib import asynccontextmanager
 from comments.views import router as comments_router
 from commons import rebuild_models
 from companies.views import router as companies_router
-from database import create_db_and_tables, run_migrations
+from database import create_db_and_tables, dispose_engines, run_migrations
 from documents.views import router as documents_router
 from events.views import router as events_router
 from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from fastapi_pagination import add_pagination
 from insurrances.views import router as insurrances_router
+from monitoring.metrics import MetricsMiddleware, instrument_pools, mark_process_dead
+from monitoring.timing import ServerTimingMiddleware
+from monitoring.views import metrics_router
+from monitoring.views import router as monitoring_router
 from refuels.views import router as refuels_router
 from reservations.views import router as reservations_router
+from search.views import router as search_router
 from users.views import router as user_router
+from vehicles.utils import shutdown_report_executor, start_report_executor
 from vehicles.views import router as vehicles_router
 
 logger = logging.getLogger("uvicorn.critical")
@@ -25,7 +31,12 @@ logger = logging.getLogger("uvicorn.critical")
 async def lifespan(app: FastAPI):
     create_db_and_tables()
     run_migrations()
+    instrument_pools()
+    start_report_executor()
     yield
+    await dispose_engines()
+    shutdown_report_executor()
+    mark_process_dead()
 
 
 app = FastAPI(
@@ -34,9 +45,12 @@ app = FastAPI(
     description="App for managing vehicles on a large scale",
     version="0.0.1",
     responses={401: {"description": "Please login to the system"}},
+    default_response_class=ORJSONResponse,
 )
 
 add_pagination(app)
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware, allow_origins=[f"http://localhost:{os.getenv('FE_PORT', '8080')}", "http://localhost:3000"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
 )
@@ -53,8 +67,11 @@ app.include_router(companies_router)
 app.include_router(documents_router)
 app.include_router(events_router)
 app.include_router(insurrances_router)
+app.include_router(metrics_router)
+app.include_router(monitoring_router)
 app.include_router(refuels_router)
 app.include_router(reservations_router)
+app.include_router(search_router)
 app.include_router(user_router)
 app.include_router(vehicles_router)
 
@@ -0,0 +1,92 @@
+import os
+import time
+
+from database import get_engines, get_pool_status
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_DURATION = Histogram("fleetflow_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+REQUESTS_IN_PROGRESS = Gauge("fleetflow_http_requests_in_progress", "HTTP requests being handled", multiprocess_mode="livesum")
+DB_QUERY_DURATION = Histogram("fleetflow_db_query_duration_seconds", "SQL statement execution time", ["statement"])
+DB_POOL_CONNECTIONS = Gauge("fleetflow_db_pool_connections", "Database pool connections", ["engine", "state"], multiprocess_mode="livesum")
+DB_POOL_CHECKOUTS = Gauge("fleetflow_db_pool_checkouts", "Database pool checkouts since start", ["engine"], multiprocess_mode="livesum")
+DB_POOL_TIMEOUTS = Gauge("fleetflow_db_pool_timeouts", "Database pool checkout timeouts since start", ["engine"], multiprocess_mode="livesum")
+DB_POOL_WAIT = Gauge("fleetflow_db_pool_wait_seconds", "Total time spent waiting for a pool connection", ["engine"], multiprocess_mode="livesum")
+DB_POOL_WAIT_MAX = Gauge("fleetflow_db_pool_wait_max_seconds", "Longest wait for a pool connection", ["engine"], multiprocess_mode="livemax")
+REPORT_RENDER_DURATION = Histogram("fleetflow_report_render_duration_seconds", "Fuel report PDF render time", buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+UPLOAD_BYTES = Histogram("fleetflow_upload_bytes", "Size of stored document files", buckets=(1024, 10240, 102400, 524288, 1048576, 5242880, 10485760, 52428800))
+UPLOAD_DURATION = Histogram("fleetflow_upload_duration_seconds", "Time to store a document file")
+PASSWORD_HASH_DURATION = Histogram("fleetflow_password_hash_duration_seconds", "bcrypt hash and verify time", ["operation"], buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1, 2, 5))
+STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+def get_statement_type(statement: str) -> str:
+    statement_type = statement.lstrip()[:6].upper()
+    return statement_type if statement_type in STATEMENTS else "OTHER"
+
+
+def update_pool_metrics(name: str, db_engine: AsyncEngine) -> None:
+    pool_status = get_pool_status(name, db_engine)
+    for state in ("size", "checked_out", "idle", "overflow"):
+        DB_POOL_CONNECTIONS.labels(name, state).set(pool_status[state])
+    DB_POOL_CHECKOUTS.labels(name).set(pool_status["checkouts"])
+    DB_POOL_TIMEOUTS.labels(name).set(pool_status["timeouts"])
+    DB_POOL_WAIT.labels(name).set(pool_status["wait_total"])
+    DB_POOL_WAIT_MAX.labels(name).set(pool_status["wait_max"])
+
+
+def update_all_pool_metrics() -> None:
+    for name, db_engine in get_engines().items():
+        update_pool_metrics(name, db_engine)
+
+
+def instrument_pools() -> None:
+    for name, db_engine in get_engines().items():
+        event.listen(db_engine.sync_engine, "checkout", lambda *args, name=name, db_engine=db_engine: update_pool_metrics(name, db_engine))
+    update_all_pool_metrics()
+
+
+def mark_process_dead() -> None:
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    update_all_pool_metrics()
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            route = scope["route"].path if "route" in scope else "unmatched"
+            REQUEST_DURATION.labels(scope["method"], route, status_code).observe(time.perf_counter() - started)
+            update_all_pool_metrics()
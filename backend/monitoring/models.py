@@ -0,0 +1,14 @@
+from database import SQLModel
+
+
+class PoolStatus(SQLModel):
+    name: str
+    size: int
+    max_overflow: int
+    checked_out: int
+    idle: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    wait_total: float
+    wait_max: float
@@ -0,0 +1,67 @@
+import logging
+import os
+from datetime import date, datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any
+
+import orjson
+from monitoring.metrics import STATEMENTS, get_statement_type
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "0"))
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE", "logs/slow_queries.log")
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", "10485760"))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+SLOW_QUERY_REDACT = os.getenv("SLOW_QUERY_REDACT", "true").lower() in ("1", "true", "yes")
+
+slow_query_logger = logging.getLogger("fleetflow.slow_queries")
+slow_query_logger.propagate = False
+
+
+def get_slow_query_logger() -> logging.Logger:
+    if not slow_query_logger.handlers:
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG_FILE) or ".", exist_ok=True)
+        slow_query_logger.addHandler(RotatingFileHandler(SLOW_QUERY_LOG_FILE, maxBytes=SLOW_QUERY_LOG_MAX_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS))
+        slow_query_logger.setLevel(logging.WARNING)
+    return slow_query_logger
+
+
+def is_slow(duration: float) -> bool:
+    return SLOW_QUERY_THRESHOLD_MS > 0 and duration * 1000 >= SLOW_QUERY_THRESHOLD_MS
+
+
+def redact(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if value is None or isinstance(value, (bool, int, float, date, datetime)):
+        return value
+    return f"<redacted {type(value).__name__}>"
+
+
+def explain(conn, statement: str, parameters: Any) -> Any:
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = cursor.fetchone()[0]
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+    return orjson.loads(plan) if isinstance(plan, str) else plan
+
+
+def log_slow_query(conn, statement: str, parameters: Any, executemany: bool, duration: float, context: dict) -> None:
+    entry = {"time": datetime.now().isoformat(), "duration_ms": round(duration * 1000, 1), **context, "statement": statement}
+    entry["parameters"] = redact(parameters) if SLOW_QUERY_REDACT else parameters
+    if SLOW_QUERY_EXPLAIN and not executemany and conn.dialect.name == "postgresql" and get_statement_type(statement) in STATEMENTS:
+        try:
+            entry["plan"] = explain(conn, statement, parameters)
+        except Exception as e:
+            entry["plan_error"] = str(e)
+    get_slow_query_logger().warning(orjson.dumps(entry, default=str).decode())
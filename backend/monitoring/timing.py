@@ -0,0 +1,121 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from monitoring.metrics import DB_QUERY_DURATION, get_statement_type
+from monitoring.slow_queries import is_slow, log_slow_query
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_TIMING_ENABLED = os.getenv("REQUEST_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("uvicorn.critical")
+
+
+class RequestTiming:
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.user: dict = {}
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialization = 0.0
+        self.app = 0.0
+
+    def log(self, status_code: int) -> None:
+        fields = {
+            "method": self.scope["method"],
+            "path": self.scope["path"],
+            "status": status_code,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "app_ms": round(self.app * 1000, 1),
+            "db_ms": round(self.db * 1000, 1),
+            "queries": self.queries,
+            "serialize_ms": round(self.serialization * 1000, 1),
+        }
+        logger.info(" ".join(f"{key}={value}" for key, value in fields.items()), extra={"request_timing": fields})
+
+    def context(self) -> dict:
+        route = self.scope["route"].path if "route" in self.scope else None
+        return {"method": self.scope["method"], "path": self.scope["path"], "route": route, **self.user}
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries", serialize;dur={self.serialization * 1000:.1f}, app;dur={self.app * 1000:.1f}'
+
+
+request_timing: ContextVar[RequestTiming | None] = ContextVar("request_timing", default=None)
+
+
+def set_request_user(user_id: int, role: str, company_id: int | None) -> None:
+    if timing := request_timing.get():
+        timing.user = {"user_id": user_id, "role": role, "company_id": company_id}
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERY_DURATION.labels(get_statement_type(statement)).observe(duration)
+    timing = request_timing.get()
+    if timing:
+        timing.queries += 1
+        timing.db += duration
+    if is_slow(duration):
+        log_slow_query(conn, statement, parameters, executemany, duration, timing.context() if timing else {})
+
+
+@event.listens_for(Engine, "handle_error")
+def handle_error(exception_context) -> None:
+    if exception_context.connection is not None and (query_start := exception_context.connection.info.get("query_start")):
+        query_start.pop()
+
+
+@contextmanager
+def measure_serialization() -> Iterator[None]:
+    if not (timing := request_timing.get()):
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.serialization += time.perf_counter() - started
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming(scope)
+        token = request_timing.set(timing)
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timing.app = time.perf_counter() - timing.started
+                if REQUEST_TIMING_ENABLED:
+                    MutableHeaders(scope=message).append("Server-Timing", timing.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timing.reset(token)
+            if REQUEST_TIMING_ENABLED:
+                timing.log(status_code)
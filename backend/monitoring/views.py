@@ -0,0 +1,25 @@
+from database import get_engines, get_pool_status
+from dependencies import LoginReqDep
+from fastapi import APIRouter, Response
+from permissions import require_role
+from users.models import UserRole
+
+from .metrics import render_metrics
+from .models import PoolStatus
+
+router = APIRouter(prefix="/monitoring", tags=["monitoring"])
+metrics_router = APIRouter(tags=["monitoring"])
+
+
+@router.get("/pool/", description="Connection pool usage and checkout wait times")
+@require_role([UserRole.ADMIN])
+async def retrive_pool_status(
+    request_user: LoginReqDep,
+) -> list[PoolStatus]:
+    return [PoolStatus.model_validate(get_pool_status(name, db_engine)) for name, db_engine in get_engines().items()]
+
+
+@metrics_router.get("/metrics", description="Prometheus metrics of all workers")
+def retrive_metrics() -> Response:
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
@@ -1,10 +1,13 @@
 from datetime import datetime
+from functools import cache
 from typing import TYPE_CHECKING
 
 from database import SQLModel
+from search.utils import get_search_rank
 from sqlalchemy import or_
-from sqlalchemy.sql import Select
-from sqlmodel import Field, Relationship, select
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import ColumnElement, Select
+from sqlmodel import Field, Index, Relationship, select
 
 if TYPE_CHECKING:
     from documents.models import Document, DocumentNestedRead
@@ -25,6 +28,12 @@ class RefuelBase(SQLModel):
 
 class Refuel(RefuelBase, table=True):
     __tablename__ = "refuels"
+    __table_args__ = (
+        Index("ix_refuels_vehicle_id_date", "vehicle_id", "date"),
+        Index("ix_refuels_user_id_date", "user_id", "date"),
+        Index("ix_refuels_document_id", "document_id"),
+        Index("ix_refuels_date", "date"),
+    )
     id: int | None = Field(primary_key=True, default=None)
     vehicle: "Vehicle" = Relationship(back_populates="refuels")
     document: "Document" = Relationship(back_populates="refuels")
@@ -32,14 +41,15 @@ class Refuel(RefuelBase, table=True):
 
     @classmethod
     def for_user(cls, user: "User") -> Select["Refuel"]:
-        from users.models import User
+        from scopes import get_scope
 
         qs = select(cls)
-        if user.is_admin:
+        scope = get_scope(user)
+        if scope.is_admin:
             return qs
-        if user.is_manager:
-            return qs.join(User).filter(User.company_id == user.company_id)
-        return qs.join(User).filter(cls.user_id == user.id)
+        if scope.is_manager:
+            return qs.filter(cls.user_id.in_(scope.member_ids()))
+        return qs.filter(cls.user_id == scope.user_id)
 
     @classmethod
     def with_search(cls, query: Select["Refuel"], search_term: str) -> Select["Refuel"]:
@@ -50,7 +60,32 @@ class Refuel(RefuelBase, table=True):
             return query
 
         search_pattern = f"%{search_term}%"
-        return query.join(Vehicle).join(User).filter(or_(Vehicle.brand.ilike(search_pattern), Vehicle.model.ilike(search_pattern), User.name.ilike(search_pattern)))
+        vehicle_ids = select(Vehicle.id).where(or_(Vehicle.brand.ilike(search_pattern), Vehicle.model.ilike(search_pattern))).correlate(None)
+        user_ids = select(User.id).where(User.name.ilike(search_pattern)).correlate(None)
+        query = query.filter(or_(cls.vehicle_id.in_(vehicle_ids), cls.user_id.in_(user_ids)))
+        # Outer joins only feed the rank and label, so PostgreSQL can drop them from the page count
+        vehicle, user = cls.search_aliases()
+        query = query.outerjoin(vehicle, cls.vehicle_id == vehicle.id).outerjoin(user, cls.user_id == user.id)
+        return query.order_by(None).order_by(cls.search_rank(search_term).desc(), cls.id)
+
+    @classmethod
+    @cache
+    def search_aliases(cls) -> tuple["Vehicle", "User"]:
+        from users.models import User
+        from vehicles.models import Vehicle
+
+        # Aliased so search joins never clash with vehicle or user joins added by callers
+        return aliased(Vehicle, name="search_vehicle"), aliased(User, name="search_user")
+
+    @classmethod
+    def search_rank(cls, search_term: str) -> ColumnElement[float]:
+        vehicle, user = cls.search_aliases()
+        return get_search_rank(search_term, vehicle.brand, vehicle.model, user.name)
+
+    @classmethod
+    def search_label(cls) -> ColumnElement[str]:
+        vehicle, user = cls.search_aliases()
+        return vehicle.brand + " " + vehicle.model + " - " + user.name
 
 
 class RefuelRead(RefuelBase):
@@ -68,6 +103,10 @@ class RefuelCreate(RefuelBase):
     pass
 
 
+class RefuelBatchUpdate(RefuelCreate):
+    id: int
+
+
 class RefuelStat(SQLModel):
     month_year: str
     total_fuel: float
@@ -1,39 +1,48 @@
 from datetime import datetime, timedelta
 
 from refuels.models import Refuel, RefuelStat
-from sqlalchemy import func
-from sqlmodel import Session, select
+from sqlalchemy import func, literal_column
+from sqlalchemy.sql import Select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from users.models import User
 
+# Inlined so asyncpg does not bind each occurrence separately, which breaks matching the GROUP BY expression.
+MONTH_YEAR_FORMAT = literal_column("'MM/YY'")
 
-def get_yearly_stats(session: Session, user: User) -> list[RefuelStat]:
-    today = datetime.today()
-    start_of_current_month = today.replace(day=1)
-    start_of_previous_12_months = (start_of_current_month - timedelta(days=365)).replace(day=1)
 
+def get_yearly_stats_query(user: User, start: datetime) -> Select:
     aggregated_query = (
         select(
-            func.to_char(Refuel.date, "MM/YY").label("month_year"),
+            func.to_char(Refuel.date, MONTH_YEAR_FORMAT).label("month_year"),
             func.sum(Refuel.fuel_amount).label("total_fuel"),
         )
-        .where(Refuel.date >= start_of_previous_12_months)
-        .group_by(func.to_char(Refuel.date, "MM/YY"))
+        .where(Refuel.date >= start)
+        .group_by(func.to_char(Refuel.date, MONTH_YEAR_FORMAT))
         .subquery()
     )
 
-    user_refuel_query = Refuel.for_user(user).filter(Refuel.date >= start_of_previous_12_months).subquery()
+    user_refuel_query = Refuel.for_user(user).filter(Refuel.date >= start).subquery()
 
-    statement = (
+    return (
         select(
-            func.to_char(user_refuel_query.c.date, "MM/YY").label("month_year"),
+            func.to_char(user_refuel_query.c.date, MONTH_YEAR_FORMAT).label("month_year"),
             func.sum(user_refuel_query.c.fuel_amount).label("total_fuel"),
         )
         .select_from(user_refuel_query)
-        .join(aggregated_query, func.to_char(user_refuel_query.c.date, "MM/YY") == aggregated_query.c.month_year)
-        .group_by(func.to_char(user_refuel_query.c.date, "MM/YY"))
+        .join(aggregated_query, func.to_char(user_refuel_query.c.date, MONTH_YEAR_FORMAT) == aggregated_query.c.month_year)
+        .group_by(func.to_char(user_refuel_query.c.date, MONTH_YEAR_FORMAT))
     )
 
-    refuels = {r.month_year: r.total_fuel for r in session.exec(statement)}
+
+async def get_yearly_stats(session: AsyncSession, user: User) -> list[RefuelStat]:
+    today = datetime.today()
+    start_of_current_month = today.replace(day=1)
+    start_of_previous_12_months = (start_of_current_month - timedelta(days=365)).replace(day=1)
+
+    statement = get_yearly_stats_query(user, start_of_previous_12_months)
+
+    refuels = {r.month_year: r.total_fuel for r in await session.exec(statement)}
 
     all_months = [(today - timedelta(days=i * 31)).strftime("%m/%y") for i in range(12)]
 
@@ -1,14 +1,18 @@
-from commons import Page, get_filters, get_from_qs_or_404, validate_obj_reference, validate_user_reference
-from dependencies import LoginReqDep, SessionDep
+from batches import BATCH_MAX_SIZE, BatchResult, check_item_user_reference, create_batch, delete_batch, update_batch
+from commons import Page, get_filters, get_from_qs_or_404, paginate, render, serialize, validate_obj_reference, validate_user_reference, with_load_options
+from dependencies import FieldsetDep, LoginReqDep, SessionDep
 from documents.models import Document
-from fastapi import APIRouter, Query, Response, status
-from fastapi_pagination.ext.sqlalchemy import paginate
+from exports import ExportFormat, export
+from fastapi import APIRouter, Body, File, Query, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from imports import ImportFormat, ImportReport, check_user_reference, import_rows
 from refuels.utils import get_yearly_stats
 from sqlalchemy.sql import Select
 from users.models import User
 from vehicles.models import Vehicle
+from vehicles.utils import report_cache
 
-from .models import Refuel, RefuelCreate, RefuelRead, RefuelStat
+from .models import Refuel, RefuelBatchUpdate, RefuelCreate, RefuelRead, RefuelStat
 
 router = APIRouter(prefix="/refuels", tags=["refuels"])
 
@@ -17,19 +21,77 @@ def get_queryset(request_user: User) -> Select[Refuel]:
     return Refuel.for_user(request_user)
 
 
+def get_list_queryset(request_user: User, vehicle_id: int | None = None, document_id: int | None = None, user_id: int | None = None, search: str | None = None) -> Select[Refuel]:
+    filters = get_filters({"vehicle_id": vehicle_id, "document_id": document_id, "user_id": user_id})
+    qs = get_queryset(request_user).filter_by(**filters)
+    return Refuel.with_search(qs, search)
+
+
 @router.get("/")
 async def list_refuels(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     vehicle_id: int = Query(None),
     document_id: int = Query(None),
     user_id: int = Query(None),
     search: str = Query(None, description="Search by vehicle brand, model or user name"),
 ) -> Page[RefuelRead]:
-    filters = get_filters({"vehicle_id": vehicle_id, "document_id": document_id, "user_id": user_id})
-    qs = get_queryset(request_user).filter_by(**filters)
-    qs = Refuel.with_search(qs, search)
-    return paginate(session, qs)
+    qs = get_list_queryset(request_user, vehicle_id, document_id, user_id, search)
+    return await paginate(session, qs, RefuelRead, fieldset)
+
+
+@router.get("/export/")
+async def export_refuels(
+    request_user: LoginReqDep,
+    vehicle_id: int = Query(None),
+    document_id: int = Query(None),
+    user_id: int = Query(None),
+    search: str = Query(None, description="Search by vehicle brand, model or user name"),
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+) -> StreamingResponse:
+    return export(get_list_queryset(request_user, vehicle_id, document_id, user_id, search), export_format, "refuels")
+
+
+@router.post("/import/")
+async def import_refuels(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    file: UploadFile = File(...),
+    import_format: ImportFormat = Query(ImportFormat.CSV, alias="format"),
+) -> ImportReport:
+    return await import_rows(session, request_user, file, import_format, Refuel, RefuelCreate, (check_user_reference,))
+
+
+@router.post("/batch/")
+async def create_refuels(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    refuels: list[RefuelCreate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    result = await create_batch(session, request_user, Refuel, refuels, (check_item_user_reference,))
+    report_cache.invalidate(*{refuel.vehicle_id for refuel in refuels})
+    return result
+
+
+@router.put("/batch/")
+async def update_refuels(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    refuels: list[RefuelBatchUpdate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    result = await update_batch(session, request_user, get_queryset(request_user), Refuel, refuels, (check_item_user_reference,))
+    report_cache.invalidate(*{refuel.vehicle_id for refuel in refuels})
+    return result
+
+
+@router.delete("/batch/")
+async def delete_refuels(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    ids: list[int] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await delete_batch(session, get_queryset(request_user), Refuel, ids)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -37,19 +99,18 @@ async def create_refuel(
     session: SessionDep,
     request_user: LoginReqDep,
     refuel: RefuelCreate,
-    response: Response,
 ) -> RefuelRead:
-    validate_obj_reference(session, refuel, Vehicle, refuel.vehicle_id)
-    validate_obj_reference(session, refuel, Document, refuel.document_id)
-    validate_obj_reference(session, refuel, User, refuel.user_id)
-    validate_user_reference(session, refuel, request_user)
+    await validate_obj_reference(session, refuel, Vehicle, refuel.vehicle_id)
+    await validate_obj_reference(session, refuel, Document, refuel.document_id)
+    await validate_obj_reference(session, refuel, User, refuel.user_id)
+    await validate_user_reference(session, refuel, request_user)
 
     db_refuel = Refuel.model_validate(refuel)
     session.add(db_refuel)
-    session.commit()
-    session.refresh(db_refuel)
-    response.status_code = status.HTTP_201_CREATED
-    return db_refuel
+    await session.commit()
+    report_cache.invalidate(db_refuel.vehicle_id)
+    await session.refresh(db_refuel)
+    return render(await serialize(session, RefuelRead, db_refuel), status.HTTP_201_CREATED)
 
 
 @router.get("/stats/")
@@ -57,17 +118,19 @@ async def retrive_refuel_stats(
     session: SessionDep,
     request_user: LoginReqDep,
 ) -> list[RefuelStat]:
-    return get_yearly_stats(session, request_user)
+    return await get_yearly_stats(session, request_user)
 
 
 @router.get("/{refuel_id}/")
 async def retrive_refuel(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     refuel_id: int,
 ) -> RefuelRead:
-    qs = get_queryset(request_user)
-    return get_from_qs_or_404(session, qs, refuel_id)
+    qs = with_load_options(get_queryset(request_user), RefuelRead, fieldset)
+    db_refuel = await get_from_qs_or_404(session, qs, refuel_id)
+    return render(await serialize(session, RefuelRead, db_refuel, fieldset))
 
 
 @router.put("/{refuel_id}/")
@@ -77,17 +140,19 @@ async def update_refuel(
     refuel_id: int,
     refuel: RefuelCreate,
 ) -> RefuelRead:
-    validate_obj_reference(session, refuel, Vehicle, refuel.vehicle_id)
-    validate_obj_reference(session, refuel, Document, refuel.document_id)
-    validate_obj_reference(session, refuel, User, refuel.user_id)
-    validate_user_reference(session, refuel, request_user)
+    await validate_obj_reference(session, refuel, Vehicle, refuel.vehicle_id)
+    await validate_obj_reference(session, refuel, Document, refuel.document_id)
+    await validate_obj_reference(session, refuel, User, refuel.user_id)
+    await validate_user_reference(session, refuel, request_user)
 
     qs = get_queryset(request_user)
-    db_refuel = get_from_qs_or_404(session, qs, refuel_id)
+    db_refuel = await get_from_qs_or_404(session, qs, refuel_id)
+    previous_vehicle_id = db_refuel.vehicle_id
     db_refuel.sqlmodel_update(refuel)
-    session.commit()
-    session.refresh(db_refuel)
-    return db_refuel
+    await session.commit()
+    report_cache.invalidate(previous_vehicle_id, db_refuel.vehicle_id)
+    await session.refresh(db_refuel)
+    return render(await serialize(session, RefuelRead, db_refuel))
 
 
 @router.delete("/{refuel_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -98,7 +163,8 @@ async def delete_refuel(
     response: Response,
 ) -> None:
     qs = get_queryset(request_user)
-    db_refuel = get_from_qs_or_404(session, qs, refuel_id)
-    session.delete(db_refuel)
-    session.commit()
+    db_refuel = await get_from_qs_or_404(session, qs, refuel_id)
+    await session.delete(db_refuel)
+    await session.commit()
+    report_cache.invalidate(db_refuel.vehicle_id)
     response.status_code = status.HTTP_204_NO_CONTENT
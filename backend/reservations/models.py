@@ -3,7 +3,7 @@ from typing import TYPE_CHECKING
 
 from database import SQLModel
 from sqlalchemy.sql import Select
-from sqlmodel import Field, Relationship, select
+from sqlmodel import Field, Index, Relationship, select
 
 if TYPE_CHECKING:
     from users.models import User, UserNestedRead
@@ -20,6 +20,11 @@ class ReservationBase(SQLModel):
 
 class Reservation(ReservationBase, table=True):
     __tablename__ = "reservations"
+    __table_args__ = (
+        Index("ix_reservations_vehicle_id_date_from", "vehicle_id", "date_from"),
+        Index("ix_reservations_user_id_date_from", "user_id", "date_from"),
+        Index("ix_reservations_date_from", "date_from"),
+    )
     id: int | None = Field(primary_key=True, default=None)
     user: "User" = Relationship(back_populates="reservations")
     vehicle: "Vehicle" = Relationship(back_populates="reservations")
@@ -48,3 +53,7 @@ class ReservationNestedRead(ReservationBase):
 
 class ReservationCreate(ReservationBase):
     pass
+
+
+class ReservationBatchUpdate(ReservationCreate):
+    id: int
@@ -1,12 +1,14 @@
-from commons import Page, get_filters, get_from_qs_or_404, validate_obj_reference, validate_user_reference
-from dependencies import LoginReqDep, SessionDep
-from fastapi import APIRouter, Query, Response, status
-from fastapi_pagination.ext.sqlalchemy import paginate
+from batches import BATCH_MAX_SIZE, BatchResult, check_item_user_reference, create_batch, delete_batch, update_batch
+from commons import Page, get_filters, get_from_qs_or_404, paginate, render, serialize, validate_obj_reference, validate_user_reference, with_load_options
+from dependencies import FieldsetDep, LoginReqDep, SessionDep
+from exports import ExportFormat, export
+from fastapi import APIRouter, Body, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.sql import Select
 from users.models import User
 from vehicles.models import Vehicle
 
-from .models import Reservation, ReservationCreate, ReservationRead
+from .models import Reservation, ReservationBatchUpdate, ReservationCreate, ReservationRead
 
 router = APIRouter(prefix="/reservations", tags=["reservations"])
 
@@ -15,26 +17,69 @@ def get_queryset(request_user: User) -> Select[Reservation]:
     return Reservation.for_user(request_user)
 
 
+def get_list_queryset(request_user: User, vehicle_id: int | None = None, user_id: int | None = None) -> Select[Reservation]:
+    filters = get_filters({"vehicle_id": vehicle_id, "user_id": user_id})
+    return get_queryset(request_user).filter_by(**filters)
+
+
 @router.get("/")
 async def list_reservations(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     vehicle_id: int = Query(None),
     user_id: int = Query(None),
 ) -> Page[ReservationRead]:
-    filters = get_filters({"vehicle_id": vehicle_id, "user_id": user_id})
-    qs = get_queryset(request_user).filter_by(**filters)
-    return paginate(session, qs)
+    qs = get_list_queryset(request_user, vehicle_id, user_id)
+    return await paginate(session, qs, ReservationRead, fieldset)
+
+
+@router.get("/export/")
+async def export_reservations(
+    request_user: LoginReqDep,
+    vehicle_id: int = Query(None),
+    user_id: int = Query(None),
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+) -> StreamingResponse:
+    return export(get_list_queryset(request_user, vehicle_id, user_id), export_format, "reservations")
 
 
 @router.get("/upcoming/", description="List reservations that are upcoming")
 async def list_upcoming_reservations(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
 ) -> Page[ReservationRead]:
     qs = get_queryset(request_user)
     qs = Reservation.upcoming(qs)
-    return paginate(session, qs)
+    return await paginate(session, qs, ReservationRead, fieldset)
+
+
+@router.post("/batch/")
+async def create_reservations(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    reservations: list[ReservationCreate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await create_batch(session, request_user, Reservation, reservations, (check_item_user_reference,))
+
+
+@router.put("/batch/")
+async def update_reservations(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    reservations: list[ReservationBatchUpdate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await update_batch(session, request_user, get_queryset(request_user), Reservation, reservations, (check_item_user_reference,))
+
+
+@router.delete("/batch/")
+async def delete_reservations(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    ids: list[int] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await delete_batch(session, get_queryset(request_user), Reservation, ids)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -42,28 +87,28 @@ async def create_reservation(
     session: SessionDep,
     request_user: LoginReqDep,
     reservation: ReservationCreate,
-    response: Response,
 ) -> ReservationRead:
-    validate_obj_reference(session, reservation, Vehicle, reservation.vehicle_id)
-    validate_obj_reference(session, reservation, User, reservation.user_id)
-    validate_user_reference(session, reservation, request_user)
+    await validate_obj_reference(session, reservation, Vehicle, reservation.vehicle_id)
+    await validate_obj_reference(session, reservation, User, reservation.user_id)
+    await validate_user_reference(session, reservation, request_user)
 
     db_reservation = Reservation.model_validate(reservation)
     session.add(db_reservation)
-    session.commit()
-    session.refresh(db_reservation)
-    response.status_code = status.HTTP_201_CREATED
-    return db_reservation
+    await session.commit()
+    await session.refresh(db_reservation)
+    return render(await serialize(session, ReservationRead, db_reservation), status.HTTP_201_CREATED)
 
 
 @router.get("/{reservation_id}/")
 async def retrive_reservation(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     reservation_id: int,
 ) -> ReservationRead:
-    qs = get_queryset(request_user)
-    return get_from_qs_or_404(session, qs, reservation_id)
+    qs = with_load_options(get_queryset(request_user), ReservationRead, fieldset)
+    db_reservation = await get_from_qs_or_404(session, qs, reservation_id)
+    return render(await serialize(session, ReservationRead, db_reservation, fieldset))
 
 
 @router.put("/{reservation_id}/")
@@ -73,16 +118,16 @@ async def update_reservation(
     reservation_id: int,
     reservation: ReservationCreate,
 ) -> ReservationRead:
-    validate_obj_reference(session, reservation, Vehicle, reservation.vehicle_id)
-    validate_obj_reference(session, reservation, User, reservation.user_id)
-    validate_user_reference(session, reservation, request_user)
+    await validate_obj_reference(session, reservation, Vehicle, reservation.vehicle_id)
+    await validate_obj_reference(session, reservation, User, reservation.user_id)
+    await validate_user_reference(session, reservation, request_user)
 
     qs = get_queryset(request_user)
-    db_reservation = get_from_qs_or_404(session, qs, reservation_id)
+    db_reservation = await get_from_qs_or_404(session, qs, reservation_id)
     db_reservation.sqlmodel_update(reservation)
-    session.commit()
-    session.refresh(db_reservation)
-    return db_reservation
+    await session.commit()
+    await session.refresh(db_reservation)
+    return render(await serialize(session, ReservationRead, db_reservation))
 
 
 @router.delete("/{reservation_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -93,7 +138,7 @@ async def delete_reservation(
     response: Response,
 ) -> None:
     qs = get_queryset(request_user)
-    db_reservation = get_from_qs_or_404(session, qs, reservation_id)
-    session.delete(db_reservation)
-    session.commit()
+    db_reservation = await get_from_qs_or_404(session, qs, reservation_id)
+    await session.delete(db_reservation)
+    await session.commit()
     response.status_code = status.HTTP_204_NO_CONTENT
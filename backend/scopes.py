@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+
+from sqlalchemy import or_
+from sqlalchemy.sql import Select
+from sqlmodel import select
+from users.models import User, UserRole
+
+
+@dataclass(frozen=True)
+class UserScope:
+    user_id: int
+    company_id: int | None
+    role: UserRole
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == UserRole.ADMIN
+
+    @property
+    def is_manager(self) -> bool:
+        return self.role == UserRole.MANAGER
+
+    def member_ids(self) -> Select:
+        return select(User.id).where(User.company_id == self.company_id)
+
+    def own_and_subordinate_ids(self) -> frozenset[int] | Select:
+        if not self.is_manager:
+            return frozenset({self.user_id})
+        return select(User.id).where(User.company_id == self.company_id, or_(User.role == UserRole.WORKER, User.id == self.user_id))
+
+
+def get_scope(user: User) -> UserScope:
+    return UserScope(user_id=user.id, company_id=user.company_id, role=user.role)
@@ -0,0 +1,18 @@
+from enum import Enum
+
+from database import SQLModel
+
+
+class SearchResultType(str, Enum):
+    VEHICLE = "vehicle"
+    USER = "user"
+    COMPANY = "company"
+    REFUEL = "refuel"
+    DOCUMENT = "document"
+
+
+class SearchResult(SQLModel):
+    type: SearchResultType
+    id: int
+    label: str
+    rank: float
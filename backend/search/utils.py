@@ -0,0 +1,6 @@
+from sqlalchemy import func
+from sqlalchemy.sql import ColumnElement
+
+
+def get_search_rank(search_term: str, *columns: ColumnElement) -> ColumnElement[float]:
+    return func.greatest(*(func.word_similarity(search_term, column) for column in columns))
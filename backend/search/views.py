@@ -0,0 +1,48 @@
+from companies.models import Company
+from dependencies import LoginReqDep, SessionDep
+from documents.models import Document
+from fastapi import APIRouter, Query
+from refuels.models import Refuel
+from sqlalchemy import literal, union_all
+from sqlalchemy.sql import Select
+from sqlmodel import select
+from users.models import User
+from vehicles.models import Vehicle
+
+from .models import SearchResult, SearchResultType
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+SEARCHABLE_MODELS = {
+    SearchResultType.VEHICLE: Vehicle,
+    SearchResultType.USER: User,
+    SearchResultType.COMPANY: Company,
+    SearchResultType.REFUEL: Refuel,
+    SearchResultType.DOCUMENT: Document,
+}
+
+
+def get_queryset(request_user: User, result_type: SearchResultType, search: str, limit: int) -> Select:
+    model = SEARCHABLE_MODELS[result_type]
+    qs = model.with_search(model.for_user(request_user), search)
+    qs = qs.with_only_columns(
+        literal(result_type.value).label("type"),
+        model.id.label("id"),
+        model.search_label().label("label"),
+        model.search_rank(search).label("rank"),
+        maintain_column_froms=True,
+    )
+    return select(qs.limit(limit).subquery())
+
+
+@router.get("/", description="Search vehicles, users, companies, refuels and documents at once, best matches first")
+async def search(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    q: str = Query(..., min_length=1, description="Search term"),
+    types: list[SearchResultType] = Query(None, description="Limit the search to these result types"),
+    limit: int = Query(5, ge=1, le=20, description="Maximum number of results per type"),
+) -> list[SearchResult]:
+    statement = union_all(*(get_queryset(request_user, result_type, q, limit) for result_type in types or SEARCHABLE_MODELS))
+    results = [SearchResult.model_validate(row._asdict()) for row in await session.exec(statement)]
+    return sorted(results, key=lambda result: result.rank, reverse=True)
@@ -0,0 +1,298 @@
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DB_URL", "postgresql://localhost/fleetflow")
+
+from seed_data_raw import get_db_connection
+from users.utils import hash_password
+
+TABLES = {
+    "companies": ("id", "name", "description", "phone", "post_code", "address1", "address2", "city", "country", "nip", "is_internal"),
+    "users": ("id", "email", "name", "role", "company_id", "password"),
+    "vehicles": (
+        "id",
+        "id_number",
+        "vin",
+        "weight",
+        "registration_number",
+        "brand",
+        "model",
+        "production_year",
+        "kilometrage",
+        "gearbox_type",
+        "availability",
+        "tire_type",
+        "company_id",
+    ),
+    "documents": ("id", "title", "description", "file_type", "vehicle_id", "user_id", "created_at", "updated_at"),
+    "refuels": ("id", "date", "fuel_amount", "price", "kilometrage_during_refuel", "gas_station", "vehicle_id", "document_id", "user_id"),
+    "events": ("id", "event_type", "date", "description", "price", "vehicle_id", "document_id", "company_id"),
+    "reservations": ("id", "date_from", "date_to", "reservation_date", "vehicle_id", "user_id"),
+    "insurrances": ("id", "insurer", "policy_number", "date_from", "date_to", "description", "price", "insurrance_type", "vehicle_id", "document_id", "company_id"),
+    "comments": ("id", "content", "vehicle_id", "user_id", "date"),
+}
+
+COMPANIES_PER_SCALE = 100
+VEHICLES_PER_SCALE = 2000
+VEHICLES_PER_MANAGER = 25
+WORKERS_PER_VEHICLE = 1.2
+
+CITIES = ["New York", "Chicago", "Los Angeles", "Boston", "Seattle", "San Francisco", "Houston", "Detroit", "Dallas", "Phoenix", "Denver", "Miami", "Atlanta"]
+COMPANY_KINDS = ["Logistics", "Transport", "Freight", "Cargo", "Delivery", "Fleet Services", "Haulage", "Courier"]
+FIRST_NAMES = ["John", "Sarah", "Mike", "Emily", "David", "Lisa", "Tom", "Anna", "James", "Maria", "Robert", "Laura", "Peter", "Kate", "Paul", "Julia"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Miller", "Davis", "Wilson", "Moore", "Taylor", "Anderson", "Thomas", "Martin", "Clark"]
+# brand, model, weight, tank size, consumption per 100 km
+VEHICLE_MODELS = [
+    ("Ford", "Transit", 2500.0, 80, 11.0),
+    ("Mercedes-Benz", "Sprinter", 2800.0, 93, 10.5),
+    ("Volkswagen", "Crafter", 2600.0, 75, 10.0),
+    ("Renault", "Master", 2400.0, 80, 9.5),
+    ("Iveco", "Daily", 3000.0, 90, 12.0),
+    ("Toyota", "Corolla", 1300.0, 50, 6.0),
+    ("Skoda", "Octavia", 1350.0, 50, 6.0),
+    ("Volvo", "FH16", 9000.0, 400, 32.0),
+    ("Scania", "R450", 8500.0, 400, 30.0),
+    ("MAN", "TGX", 8800.0, 400, 31.0),
+]
+GAS_STATIONS = ["Shell", "BP", "Orlen", "Circle K", "Texaco", "Esso", "Moya", "Amic", "Lotos", "Total"]
+GEARBOX_TYPES = ["MANUAL", "AUTO", "SEMIAUTO"]
+TIRE_TYPES = ["SUMMER", "WINTER", "ALLSEASON"]
+EVENT_TYPES = [("Maintenance", 450.0), ("Tire Change", 200.0), ("Inspection", 120.0), ("Repair", 900.0), ("Cleaning", 60.0)]
+INSURERS = ["PZU", "Warta", "Allianz", "Generali", "Ergo Hestia", "AXA"]
+INSURRANCE_TYPES = ["OC", "AC", "OCAC"]
+COMMENTS = ["Vehicle running smoothly.", "Strange noise from the engine.", "Needs cleaning.", "Check tire pressure.", "Brakes feel soft.", "Low on washer fluid."]
+
+
+class CopyWriter:
+    def __init__(self, conn, table: str, batch_size: int, parents: tuple["CopyWriter", ...] = ()):
+        self.conn = conn
+        self.table = table
+        self.batch_size = batch_size
+        self.parents = parents
+        self.lines = []
+        self.count = 0
+
+    def add(self, *values) -> None:
+        self.write("\t".join("\\N" if value is None else str(value) for value in values))
+
+    def write(self, line: str) -> None:
+        self.lines.append(line)
+        self.count += 1
+        if len(self.lines) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        for parent in self.parents:
+            parent.flush()
+        if not self.lines:
+            return
+        if self.conn is not None:
+            data = io.StringIO("\n".join(self.lines) + "\n")
+            with self.conn.cursor() as cur:
+                cur.copy_expert(f"COPY {self.table} ({', '.join(TABLES[self.table])}) FROM STDIN", data)
+        self.lines = []
+
+
+def zipf_sizes(rng: random.Random, total: int, count: int, exponent: float) -> list[int]:
+    weights = [1 / rank**exponent for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    scale = (total - count) / sum(weights)
+    sizes = [1 + int(weight * scale) for weight in weights]
+    for index in range(total - sum(sizes)):
+        sizes[index % count] += 1
+    return sizes
+
+
+class ScaleSeeder:
+    def __init__(self, conn, args: argparse.Namespace):
+        self.rng = random.Random(args.seed)
+        self.args = args
+        self.end = args.end_date
+        self.start = self.end - timedelta(days=365 * args.years)
+        self.password = hash_password("FleetFlow1!")
+        self.writers = {}
+        for table in TABLES:
+            parents = tuple(self.writers[name] for name in ("companies", "users", "vehicles", "documents") if name in self.writers)
+            self.writers[table] = CopyWriter(conn, table, args.batch_size, parents)
+        self.ids = dict.fromkeys(TABLES, 0)
+
+    def add(self, table: str, *values) -> int:
+        self.ids[table] += 1
+        self.writers[table].add(self.ids[table], *values)
+        return self.ids[table]
+
+    def seed(self) -> None:
+        companies = max(1, round(COMPANIES_PER_SCALE * self.args.scale))
+        vehicles = max(companies, round(VEHICLES_PER_SCALE * self.args.scale))
+        admin_company_id = self.add(
+            "companies", "FleetFlow Admin", "System administration company", "555-0000", "00000", "Admin Building", "", "System", "Global", "0000000000", True
+        )
+        self.add("users", "admin@example.com", "System Administrator", "ADMIN", admin_company_id, self.password)
+        for number, size in enumerate(zipf_sizes(self.rng, vehicles, companies, self.args.zipf), start=1):
+            self.seed_company(number, size)
+        for writer in self.writers.values():
+            writer.flush()
+
+    def seed_company(self, number: int, size: int) -> None:
+        rng = self.rng
+        city = rng.choice(CITIES)
+        company_id = self.add(
+            "companies",
+            f"{rng.choice(LAST_NAMES)} {rng.choice(COMPANY_KINDS)} {number}",
+            f"Fleet of {size} vehicles",
+            f"555-{number % 10000:04d}",
+            f"{rng.randrange(100000):05d}",
+            f"{rng.randint(1, 999)} {rng.choice(LAST_NAMES)} St",
+            "",
+            city,
+            "USA",
+            f"{number:010d}",
+            True,
+        )
+        domain = f"company{number}.example.com"
+        for index in range(max(1, size // VEHICLES_PER_MANAGER)):
+            self.add("users", f"manager{index + 1}@{domain}", self.person_name(), "MANAGER", company_id, self.password)
+        workers = [
+            self.add("users", f"worker{index + 1}@{domain}", self.person_name(), "WORKER", company_id, self.password) for index in range(max(1, round(size * WORKERS_PER_VEHICLE)))
+        ]
+        for _ in range(size):
+            self.seed_vehicle(company_id, workers)
+
+    def person_name(self) -> str:
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def seed_vehicle(self, company_id: int, workers: list[int]) -> None:
+        rng = self.rng
+        brand, model, weight, tank, consumption = rng.choice(VEHICLE_MODELS)
+        consumption *= rng.uniform(0.85, 1.2)
+        daily_km = rng.lognormvariate(4.8, 0.5)
+        start_km = rng.randint(0, 200000)
+
+        # Refuels are generated before the vehicle row so that its kilometrage matches the last odometer reading.
+        refuels = []
+        uniform, choice, total_days = rng.uniform, rng.choice, (self.end - self.start).days
+        seconds, km = uniform(0, 72 * 3600), start_km
+        while True:
+            fuel = round(tank * uniform(0.5, 0.95), 2)
+            distance = fuel / consumption * 100
+            seconds += 86400 * distance / daily_km * uniform(0.7, 1.3)
+            date = self.start + timedelta(seconds=int(seconds))
+            if date >= self.end:
+                break
+            km += max(1, round(distance * uniform(0.9, 1.1)))
+            price_per_liter = 5.5 + 1.5 * seconds / 86400 / total_days + uniform(-0.3, 0.3)
+            refuels.append((date, fuel, round(fuel * price_per_liter, 2), km, choice(GAS_STATIONS), choice(workers)))
+
+        vehicle_id = self.add(
+            "vehicles",
+            f"ID{self.ids['vehicles'] + 1:08d}",
+            "".join(rng.choices("ABCDEFGHJKLMNPRSTUVWXYZ0123456789", k=17)),
+            weight,
+            f"{rng.choice('WKGPDS')}{rng.choice('ABCDEFGHJKLMNPRSTUVWXYZ')} {self.ids['vehicles'] + 1:05d}",
+            brand,
+            model,
+            rng.randint(self.end.year - 12, self.end.year - 1),
+            km,
+            rng.choice(GEARBOX_TYPES),
+            "INUSE" if rng.random() < 0.6 else rng.choice(["AVAILABLE", "SERVICE", "BOOKED", "DECOMMISSIONED"]),
+            rng.choice(TIRE_TYPES),
+            company_id,
+        )
+        owner_id = rng.choice(workers)
+        receipts_id = self.add("documents", f"Fuel receipts {vehicle_id}", "Scanned fuel receipts", "receipt", vehicle_id, owner_id, self.start, self.start)
+        service_id = self.add("documents", f"Service book {vehicle_id}", "Service and insurance records", "service", vehicle_id, owner_id, self.start, self.start)
+
+        writer, refuel_id = self.writers["refuels"], self.ids["refuels"]
+        for refuel_id, (date, fuel, price, km, station, user_id) in enumerate(refuels, start=refuel_id + 1):
+            writer.write(f"{refuel_id}\t{date}\t{fuel}\t{price}\t{km}\t{station}\t{vehicle_id}\t{receipts_id}\t{user_id}")
+        self.ids["refuels"] = refuel_id
+
+        event_every = max(1, len(refuels) // max(1, self.args.years * 4))
+        for date, _, _, km, _, _ in refuels[event_every - 1 :: event_every]:
+            event_type, base_price = rng.choice(EVENT_TYPES)
+            event_date = date + timedelta(hours=rng.uniform(1, 48))
+            self.add("events", event_type, event_date, f"{event_type} at {km} km", round(base_price * rng.uniform(0.5, 2), 2), vehicle_id, service_id, company_id)
+
+        writer, reservation_id = self.writers["reservations"], self.ids["reservations"]
+        date_to, gap_rate = self.start + timedelta(days=rng.randint(0, 14)), 1 / (self.args.reservation_gap * 24)
+        while True:
+            date_from = date_to + timedelta(hours=1 + int(rng.expovariate(gap_rate)))
+            date_to = date_from + timedelta(hours=rng.randint(4, 24 * 5))
+            if date_to >= self.end:
+                break
+            reservation_id += 1
+            writer.write(f"{reservation_id}\t{date_from}\t{date_to}\t{date_from - timedelta(days=rng.randint(1, 14))}\t{vehicle_id}\t{rng.choice(workers)}")
+        self.ids["reservations"] = reservation_id
+
+        for year in range(self.args.years):
+            date_from = self.start + timedelta(days=365 * year)
+            self.add(
+                "insurrances",
+                rng.choice(INSURERS),
+                f"POL-{self.ids['insurrances'] + 1:09d}",
+                date_from,
+                date_from + timedelta(days=365),
+                f"Policy for year {year + 1}",
+                round(rng.uniform(800, 6000), 2),
+                rng.choice(INSURRANCE_TYPES),
+                vehicle_id,
+                service_id,
+                company_id,
+            )
+
+        for _ in range(rng.randint(0, 2 * self.args.years)):
+            self.add("comments", rng.choice(COMMENTS), vehicle_id, rng.choice(workers), self.start + timedelta(seconds=rng.uniform(0, (self.end - self.start).total_seconds())))
+
+
+def reset_tables(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+
+
+def finish_tables(conn) -> None:
+    with conn.cursor() as cur:
+        for table in TABLES:
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table}")
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"VACUUM ANALYZE {', '.join(TABLES)}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate a deterministic, scalable dataset for performance testing. Existing data will be cleared.")
+    parser.add_argument("--scale", type=float, default=1.0, help=f"scale factor, 1.0 is {COMPANIES_PER_SCALE} companies and {VEHICLES_PER_SCALE} vehicles")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--years", type=int, default=3, help="length of the generated history")
+    parser.add_argument("--end-date", type=datetime.fromisoformat, default=datetime(2025, 1, 1), help="end of the generated history")
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of the company size distribution")
+    parser.add_argument("--reservation-gap", type=float, default=5.0, help="mean number of days between reservations of a vehicle")
+    parser.add_argument("--batch-size", type=int, default=100000, help="rows per COPY statement")
+    parser.add_argument("--dry-run", action="store_true", help="generate rows without connecting to the database")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    started = time.perf_counter()
+    conn = None if args.dry_run else get_db_connection()
+    if conn is not None:
+        reset_tables(conn)
+    seeder = ScaleSeeder(conn, args)
+    seeder.seed()
+    if conn is not None:
+        finish_tables(conn)
+        conn.close()
+    for table, writer in seeder.writers.items():
+        print(f"{table:<14} {writer.count:>12,}")
+    print(f"Finished in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
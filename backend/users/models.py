@@ -3,11 +3,12 @@ from typing import TYPE_CHECKING, Optional
 
 from database import SQLModel
 from pydantic import field_validator, model_validator
+from search.utils import get_search_rank
 from sqlalchemy import or_
-from sqlalchemy.sql import Select
+from sqlalchemy.sql import ColumnElement, Select
 from sqlmodel import Column
 from sqlmodel import Enum as EnumSQL
-from sqlmodel import Field, Relationship, select
+from sqlmodel import Field, Index, Relationship, select
 
 if TYPE_CHECKING:
     from comments.models import Comment, CommentNestedRead
@@ -32,6 +33,11 @@ class UserBase(SQLModel):
 
 class User(UserBase, table=True):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_company_id_role", "company_id", "role"),
+        Index("ix_users_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_users_email_trgm", "email", postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+    )
     id: Optional[int] = Field(primary_key=True, default=None)
     password: str = Field(max_length=128)
     refuels: list["Refuel"] = Relationship(back_populates="user", cascade_delete=True)
@@ -53,7 +59,16 @@ class User(UserBase, table=True):
             return query
 
         search_pattern = f"%{search_term}%"
-        return query.filter(or_(cls.name.ilike(search_pattern), cls.email.ilike(search_pattern)))
+        query = query.filter(or_(cls.name.ilike(search_pattern), cls.email.ilike(search_pattern)))
+        return query.order_by(None).order_by(cls.search_rank(search_term).desc(), cls.id)
+
+    @classmethod
+    def search_rank(cls, search_term: str) -> ColumnElement[float]:
+        return get_search_rank(search_term, cls.name, cls.email)
+
+    @classmethod
+    def search_label(cls) -> ColumnElement[str]:
+        return cls.name
 
     @classmethod
     def with_role(cls, query: Select["User"], role: str) -> Select["User"]:
@@ -62,13 +77,6 @@ class User(UserBase, table=True):
 
         return query.filter(cls.role == role)
 
-    def get_subordinates(self) -> Select["User"]:
-        if self.is_admin:
-            return select(User).filter(User.role != UserRole.ADMIN)
-        elif self.is_manager:
-            return select(User).filter(User.company_id == self.company_id).filter(User.role == UserRole.WORKER)
-        return select(User).filter(False)
-
     @property
     def is_admin(self) -> bool:
         return self.role == UserRole.ADMIN
@@ -1,11 +1,63 @@
+import asyncio
 import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Any, Callable
 
+from commons import raise_http_error
+from fastapi import status
 from jose import jwt
+from monitoring.metrics import PASSWORD_HASH_DURATION
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"])
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "5"))
+pwd_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=PASSWORD_HASH_ROUNDS, bcrypt__min_rounds=PASSWORD_HASH_ROUNDS, bcrypt__max_rounds=PASSWORD_HASH_ROUNDS)
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password")
+password_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE)
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+
+
+class TokenCache:
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: OrderedDict[str, tuple[float, dict, dict]] = OrderedDict()
+
+    def get(self, token: str) -> tuple[dict, dict] | None:
+        if not (entry := self.entries.get(token)):
+            return None
+        expires_at, claims, user = entry
+        if expires_at <= time.monotonic():
+            del self.entries[token]
+            return None
+        self.entries.move_to_end(token)
+        return claims, user
+
+    def set(self, token: str, claims: dict, user: dict) -> None:
+        ttl = min(self.ttl, claims["exp"] - time.time()) if "exp" in claims else self.ttl
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        self.entries[token] = (time.monotonic() + ttl, claims, user)
+        self.entries.move_to_end(token)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        for token in [token for token, (_, _, user) in self.entries.items() if user["id"] == user_id]:
+            del self.entries[token]
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+token_cache = TokenCache(AUTH_CACHE_TTL, AUTH_CACHE_SIZE)
 
 
 def hash_password(password: str) -> str:
@@ -16,6 +68,26 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def run_timed(func: Callable[..., Any], *args: Any) -> Any:
+    with PASSWORD_HASH_DURATION.labels(func.__name__).time():
+        return func(*args)
+
+
+async def run_in_password_pool(func: Callable[..., Any], *args: Any) -> Any:
+    try:
+        await asyncio.wait_for(password_slots.acquire(), PASSWORD_HASH_QUEUE_TIMEOUT)
+    except TimeoutError:
+        raise_http_error(status.HTTP_503_SERVICE_UNAVAILABLE, "Too many password operations in progress, please try again.")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, run_timed, func, *args)
+    finally:
+        password_slots.release()
+
+
 def create_access_token(email: str) -> str:
     expire_time = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode = {"sub": email, "exp": expire_time}
@@ -1,14 +1,25 @@
-from commons import Page, get_filters, get_from_qs_or_404, get_user, raise_perm_error, raise_validation_error, validate_obj_reference
+from commons import (
+    Page,
+    get_filters,
+    get_from_qs_or_404,
+    get_user,
+    paginate,
+    raise_perm_error,
+    raise_validation_error,
+    render,
+    serialize,
+    validate_obj_reference,
+    with_load_options,
+)
 from companies.models import Company
-from dependencies import LoginReqDep, SessionDep
+from dependencies import FieldsetDep, LoginReqDep, SessionDep
 from fastapi import APIRouter, HTTPException, Query, Response, status
-from fastapi_pagination.ext.sqlalchemy import paginate
 from permissions import require_role
 from sqlalchemy.sql import Select
 from sqlmodel import select
 
 from .models import User, UserCreate, UserLogin, UserRead, UserRole
-from .utils import create_access_token, hash_password, verify_password
+from .utils import create_access_token, hash_password, run_in_password_pool, token_cache, verify_and_update_password
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -21,6 +32,7 @@ def get_queryset(request_user: User) -> Select[User]:
 async def list_users(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     company_id: int = Query(None),
     search: str = Query(None, description="Search by user name or email"),
     role: str = Query(None, description="Filter by user role (admin, manager, worker)"),
@@ -29,7 +41,7 @@ async def list_users(
     qs = get_queryset(request_user).filter_by(**filters)
     qs = User.with_search(qs, search)
     qs = User.with_role(qs, role)
-    return paginate(session, qs)
+    return await paginate(session, qs, UserRead, fieldset)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -38,21 +50,19 @@ async def create_user(
     session: SessionDep,
     user: UserCreate,
     request_user: LoginReqDep,
-    response: Response,
 ) -> UserRead:
     if request_user.role == UserRole.MANAGER and user.role != UserRole.WORKER:
         raise_perm_error(user.model_dump())
 
-    if get_user(session, user.email):
+    if await get_user(session, user.email):
         raise_validation_error("This email has already been taken.", user.model_dump())
-    validate_obj_reference(session, user, Company, user.company_id)
+    await validate_obj_reference(session, user, Company, user.company_id)
 
-    db_user = User.model_validate(user, update={"password": hash_password(user.password1)})
+    db_user = User.model_validate(user, update={"password": await run_in_password_pool(hash_password, user.password1)})
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
-    response.status_code = status.HTTP_201_CREATED
-    return db_user
+    await session.commit()
+    await session.refresh(db_user)
+    return render(await serialize(session, UserRead, db_user), status.HTTP_201_CREATED)
 
 
 @router.put("/{user_id}/")
@@ -64,18 +74,19 @@ async def update_user(
 ) -> UserRead:
     if request_user.role != UserRole.ADMIN and request_user.id != user_id:
         raise_perm_error(user.model_dump())
-    if request_user.id == user_id and request_user.email != user.email and get_user(session, user.email):
+    if request_user.id == user_id and request_user.email != user.email and await get_user(session, user.email):
         raise_validation_error("This email has already been taken.", user.model_dump())
-    validate_obj_reference(session, user, Company, user.company_id)
+    await validate_obj_reference(session, user, Company, user.company_id)
 
-    user = User.model_validate(user, update={"password": hash_password(user.password1), "id": user_id})
+    user = User.model_validate(user, update={"password": await run_in_password_pool(hash_password, user.password1), "id": user_id})
 
     qs = get_queryset(request_user)
-    db_user = get_from_qs_or_404(session, qs, user_id)
+    db_user = await get_from_qs_or_404(session, qs, user_id)
     db_user.sqlmodel_update(user)
-    session.commit()
-    session.refresh(db_user)
-    return db_user
+    await session.commit()
+    token_cache.invalidate(user_id)
+    await session.refresh(db_user)
+    return render(await serialize(session, UserRead, db_user))
 
 
 @router.delete("/{user_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -89,17 +100,24 @@ async def delete_user(
         raise_perm_error({"user_id": user_id})
 
     qs = get_queryset(request_user)
-    db_user = get_from_qs_or_404(session, qs, user_id)
-    session.delete(db_user)
-    session.commit()
+    db_user = await get_from_qs_or_404(session, qs, user_id)
+    await session.delete(db_user)
+    await session.commit()
+    token_cache.invalidate(user_id)
     response.status_code = status.HTTP_204_NO_CONTENT
 
 
 @router.post("/login/")
-def login(session: SessionDep, response: Response, data: UserLogin) -> dict:
-    user = get_user(session, data.email)
-    if not user or not verify_password(data.password, user.password):
+async def login(session: SessionDep, response: Response, data: UserLogin) -> dict:
+    user = await get_user(session, data.email)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    is_valid, new_hash = await run_in_password_pool(verify_and_update_password, data.password, user.password)
+    if not is_valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    if new_hash:
+        user.password = new_hash
+        await session.commit()
 
     access_token = create_access_token(user.email)
 
@@ -108,7 +126,7 @@ def login(session: SessionDep, response: Response, data: UserLogin) -> dict:
         key="token", value=access_token, httponly=True, secure=False, samesite="lax", max_age=3600  # Set to True in production with HTTPS  # 1 hour, matches token expiration
     )
 
-    return {"access_token": access_token, "token_type": "bearer", "user": UserRead.model_validate(user)}
+    return {"access_token": access_token, "token_type": "bearer", "user": await serialize(session, UserRead, user)}
 
 
 @router.post("/logout/", status_code=status.HTTP_204_NO_CONTENT)
@@ -118,5 +136,7 @@ def logout(response: Response) -> Response:
 
 
 @router.get("/me/")
-def retrive_current_user(request_user: LoginReqDep) -> UserRead:
-    return request_user
+async def retrive_current_user(session: SessionDep, request_user: LoginReqDep, fieldset: FieldsetDep) -> UserRead:
+    qs = with_load_options(get_queryset(request_user), UserRead, fieldset)
+    db_user = await get_from_qs_or_404(session, qs, request_user.id)
+    return render(await serialize(session, UserRead, db_user, fieldset))
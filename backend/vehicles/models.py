@@ -2,11 +2,12 @@ from enum import Enum
 from typing import TYPE_CHECKING, Optional
 
 from database import SQLModel
+from search.utils import get_search_rank
 from sqlalchemy import or_
-from sqlalchemy.sql import Select
+from sqlalchemy.sql import ColumnElement, Select
 from sqlmodel import Column
 from sqlmodel import Enum as EnumSQL
-from sqlmodel import Field, Relationship, select
+from sqlmodel import Field, Index, Relationship, select
 
 if TYPE_CHECKING:
     from comments.models import Comment, CommentNestedRead
@@ -56,6 +57,12 @@ class VehicleBase(SQLModel):
 
 class Vehicle(VehicleBase, table=True):
     __tablename__ = "vehicles"
+    __table_args__ = (
+        Index("ix_vehicles_company_id_availability", "company_id", "availability"),
+        Index("ix_vehicles_model_trgm", "model", postgresql_using="gin", postgresql_ops={"model": "gin_trgm_ops"}),
+        Index("ix_vehicles_brand_trgm", "brand", postgresql_using="gin", postgresql_ops={"brand": "gin_trgm_ops"}),
+        Index("ix_vehicles_registration_number_trgm", "registration_number", postgresql_using="gin", postgresql_ops={"registration_number": "gin_trgm_ops"}),
+    )
     id: Optional[int] = Field(primary_key=True, default=None)
     company: "Company" = Relationship(back_populates="vehicles")
     documents: list["Document"] = Relationship(back_populates="vehicle", cascade_delete=True)
@@ -77,7 +84,16 @@ class Vehicle(VehicleBase, table=True):
             return query
 
         search_pattern = f"%{search_term}%"
-        return query.filter(or_(cls.model.ilike(search_pattern), cls.brand.ilike(search_pattern), cls.registration_number.ilike(search_pattern)))
+        query = query.filter(or_(cls.model.ilike(search_pattern), cls.brand.ilike(search_pattern), cls.registration_number.ilike(search_pattern)))
+        return query.order_by(None).order_by(cls.search_rank(search_term).desc(), cls.id)
+
+    @classmethod
+    def search_rank(cls, search_term: str) -> ColumnElement[float]:
+        return get_search_rank(search_term, cls.model, cls.brand, cls.registration_number)
+
+    @classmethod
+    def search_label(cls) -> ColumnElement[str]:
+        return cls.brand + " " + cls.model + " " + cls.registration_number
 
     @classmethod
     def with_status(cls, query: Select["Vehicle"], status: str) -> Select["Vehicle"]:
@@ -110,3 +126,7 @@ class VehicleNestedRead(VehicleBase):
 
 class VehicleCreate(VehicleBase):
     pass
+
+
+class VehicleBatchUpdate(VehicleCreate):
+    id: int
@@ -1,134 +1,308 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from io import BytesIO
+from typing import AsyncIterator, Iterable, NamedTuple, Sequence
 
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from commons import StreamBuffer
+from monitoring.metrics import REPORT_RENDER_DURATION
+from refuels.models import Refuel
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.sql import Select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from users.models import User
 from vehicles.models import Vehicle
 
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "128"))
+REPORT_CACHE_MAX_REPORT_SIZE = int(os.getenv("REPORT_CACHE_MAX_REPORT_SIZE", str(5 * 1024 * 1024)))
+REPORT_ROWS_BATCH = int(os.getenv("REPORT_ROWS_BATCH", "1000"))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "0")) or None
+
+report_executor: ProcessPoolExecutor | None = None
+
+RefuelRow = tuple[datetime, float, float, int, str]
+REFUEL_ROW_COLUMNS = (Refuel.date, Refuel.fuel_amount, Refuel.price, Refuel.kilometrage_during_refuel, User.name)
+
+
+class ReportHeader(NamedTuple):
+    title: str
+    registration_number: str
+    production_year: int
+    vin: str
+    kilometrage: int
+    gearbox_type: str
+
+    @classmethod
+    def from_vehicle(cls, vehicle: Vehicle) -> "ReportHeader":
+        return cls(str(vehicle), vehicle.registration_number, vehicle.production_year, vehicle.vin, vehicle.kilometrage, vehicle.gearbox_type.value)
+
+
+class FuelReportJob(NamedTuple):
+    vehicle_id: int
+    filename: str
+    version: str
+    header: ReportHeader
+    report: bytes | None
+    rows: list[RefuelRow]
+
+
+def filter_refuel_dates(qs: Select, date_from: datetime | None = None, date_to: datetime | None = None) -> Select:
+    if date_from is not None:
+        qs = qs.where(Refuel.date >= date_from)
+    if date_to is not None:
+        qs = qs.where(Refuel.date <= date_to)
+    return qs
+
+
+def get_refuel_rows_query(vehicle_id: int, date_from: datetime | None = None, date_to: datetime | None = None) -> Select:
+    qs = select(*REFUEL_ROW_COLUMNS).join(User, Refuel.user_id == User.id)
+    qs = filter_refuel_dates(qs.where(Refuel.vehicle_id == vehicle_id), date_from, date_to)
+    return qs.order_by(Refuel.date.desc(), Refuel.id.desc())
+
+
+async def get_refuel_rows_by_vehicle(session: AsyncSession, vehicle_ids: Sequence[int]) -> dict[int, list[RefuelRow]]:
+    rows = defaultdict(list)
+    if not vehicle_ids:
+        return rows
+    qs = select(Refuel.vehicle_id, *REFUEL_ROW_COLUMNS).join(User, Refuel.user_id == User.id).where(Refuel.vehicle_id.in_(vehicle_ids))
+    for vehicle_id, *row in (await session.exec(qs.order_by(Refuel.vehicle_id, Refuel.date.desc(), Refuel.id.desc()))).all():
+        rows[vehicle_id].append(tuple(row))
+    return rows
+
+
+def get_report_version_query(vehicle_ids: Sequence[int], date_from: datetime | None = None, date_to: datetime | None = None) -> Select:
+    row = func.concat_ws("|", Refuel.id, *REFUEL_ROW_COLUMNS)
+    qs = select(Refuel.vehicle_id, func.md5(func.string_agg(row, aggregate_order_by(literal_column("','"), Refuel.id))))
+    qs = qs.join(User, Refuel.user_id == User.id).where(Refuel.vehicle_id.in_(vehicle_ids))
+    return filter_refuel_dates(qs, date_from, date_to).group_by(Refuel.vehicle_id)
+
+
+def get_report_version(vehicle: Vehicle, aggregates: Sequence, date_from: datetime | None = None, date_to: datetime | None = None) -> str:
+    return hashlib.sha256(repr((tuple(ReportHeader.from_vehicle(vehicle)), date_from, date_to, tuple(aggregates))).encode()).hexdigest()[:32]
+
+
+async def get_report_versions(session: AsyncSession, vehicles: Sequence[Vehicle], date_from: datetime | None = None, date_to: datetime | None = None) -> dict[int, str]:
+    qs = get_report_version_query([vehicle.id for vehicle in vehicles], date_from, date_to)
+    aggregates = {row[0]: row[1:] for row in (await session.exec(qs)).all()}
+    return {vehicle.id: get_report_version(vehicle, aggregates.get(vehicle.id, ()), date_from, date_to) for vehicle in vehicles}
+
+
+async def stream_refuel_rows(session: AsyncSession, qs: Select) -> AsyncIterator[Sequence[RefuelRow]]:
+    result = await session.stream(qs.execution_options(yield_per=REPORT_ROWS_BATCH))
+    async for rows in result.partitions():
+        yield rows
+
+
+class ReportCache:
+    def __init__(self, max_size: int, max_report_size: int):
+        self.max_size = max_size
+        self.max_report_size = max_report_size
+        self.entries: OrderedDict[tuple[int, str], bytes] = OrderedDict()
+
+    def get(self, vehicle_id: int, version: str) -> bytes | None:
+        if (report := self.entries.get((vehicle_id, version))) is not None:
+            self.entries.move_to_end((vehicle_id, version))
+        return report
+
+    def set(self, vehicle_id: int, version: str, report: bytes) -> None:
+        if self.max_size <= 0 or len(report) > self.max_report_size:
+            return
+        self.invalidate(vehicle_id)
+        self.entries[(vehicle_id, version)] = report
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, *vehicle_ids: int) -> None:
+        for key in [key for key in self.entries if key[0] in vehicle_ids]:
+            del self.entries[key]
+
+
+report_cache = ReportCache(REPORT_CACHE_SIZE, REPORT_CACHE_MAX_REPORT_SIZE)
+
 
 class VehicleFuelUsageReportGenerator:
-    def __init__(self, vehicle: Vehicle):
-        self.vehicle = vehicle
+    margin = 30
+    cell_padding = 4
+    fuel_row_height = 20
+    fuel_headers = ("Date", "Amount [l]", "Price", "Kilometrage", "Person")
+    car_headers = ("Production year", "VIN", "Kilometrage", "Gearbox type")
+
+    def __init__(self, header: ReportHeader, date_from: datetime | None = None, date_to: datetime | None = None):
+        started = time.perf_counter()
+        self.header = header
+        self.date_from = date_from
+        self.date_to = date_to
         self.now = datetime.now()
         self.buffer = BytesIO()
         self.width, self.height = A4
-        self.doc = SimpleDocTemplate(
-            self.buffer,
-            rightMargin=30,
-            leftMargin=30,
-            topMargin=30,
-            bottomMargin=30,
-            pageSize=A4,
-        )
-        self.prepare_styles()
+        self.canvas = Canvas(self.buffer, pagesize=A4, pageCompression=1)
         self.datetime_format = "%Y-%m-%d %H:%M"
-        self.data = []
-
-    def prepare_styles(self) -> None:
-        self.styles = getSampleStyleSheet()
-        self.styles.add(ParagraphStyle(name="BrandHeader", fontSize=30, alignment=TA_CENTER, fontName="Helvetica-Bold"))
-        self.styles.add(ParagraphStyle(name="PlatesHeader", fontSize=24, alignment=TA_CENTER, fontName="Helvetica-Bold"))
-        self.styles.add(ParagraphStyle(name="ParagraphTitle", fontSize=12, alignment=TA_CENTER, fontName="Helvetica-Bold"))
-        self.styles.add(ParagraphStyle(name="ParagraphCell", fontSize=10, alignment=TA_CENTER, fontName="Helvetica"))
-        self.styles.add(ParagraphStyle(name="TableMeta", fontSize=8, alignment=TA_RIGHT, fontName="Helvetica"))
-
-    def prepare_title_table(self) -> None:
-        brand_style = self.styles["BrandHeader"]
-        plates_style = self.styles["PlatesHeader"]
-
-        data = [
-            [Paragraph(str(self.vehicle), brand_style)],
-            [Paragraph(self.vehicle.registration_number, plates_style)],
-        ]
-        table = Table(data, colWidths=self.width * 0.8, rowHeights=self.height * 0.05)
-        table.setStyle(
-            TableStyle(
-                [
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                ]
-            )
-        )
-        self.data.append(table)
-        self.data.append(Spacer(1, 30))
+        self.fuel_column_width = self.width * 0.15
+        self.fuel_table_left = (self.width - self.fuel_column_width * len(self.fuel_headers)) / 2
+        self.fuel_row_edges: list[float] = []
+        self.font: tuple[str, int] | None = None
+        self.y = self.height - self.margin
+        self.prepare_meta()
+        self.prepare_title()
+        self.prepare_car_data_table()
+        self.prepare_range()
+        self.prepare_fuel_table_header()
+        self.render_time = time.perf_counter() - started
+
+    def fit_text(self, text: str, font: str, size: int, width: float) -> tuple[str, float]:
+        width -= 2 * self.cell_padding
+        if (text_width := stringWidth(text, font, size)) <= width:
+            return text, text_width
+        while text and (text_width := stringWidth(text + "...", font, size)) > width:
+            text = text[:-1]
+        return text + "...", text_width
+
+    def draw_row(self, values: Sequence[str], left: float, column_width: float, height: float, font: str, size: int) -> None:
+        if (font, size) != self.font:
+            self.canvas.setFont(font, size)
+            self.font = (font, size)
+        baseline = self.y - height / 2 - size * 0.35
+        for i, value in enumerate(values):
+            text, text_width = self.fit_text(value, font, size, column_width)
+            self.canvas.drawString(left + column_width * (i + 0.5) - text_width / 2, baseline, text)
+        self.y -= height
+
+    def prepare_meta(self) -> None:
+        self.canvas.setFont("Helvetica", 8)
+        self.font = ("Helvetica", 8)
+        self.y -= 8
+        self.canvas.drawRightString(self.width - self.margin, self.y, self.now.strftime(self.datetime_format))
+
+    def prepare_title(self) -> None:
+        row_height = self.height * 0.05
+        self.draw_row([self.header.title], self.width * 0.1, self.width * 0.8, row_height, "Helvetica-Bold", 30)
+        self.draw_row([self.header.registration_number], self.width * 0.1, self.width * 0.8, row_height, "Helvetica-Bold", 24)
+        self.y -= 30
 
     def prepare_car_data_table(self) -> None:
-        paragraph_title_style = self.styles["ParagraphTitle"]
-        paragraph_content_style = self.styles["ParagraphCell"]
-        data = [
-            [
-                Paragraph("Production year", paragraph_title_style),
-                Paragraph("VIN", paragraph_title_style),
-                Paragraph("Kilometrage", paragraph_title_style),
-                Paragraph("Gearbox type", paragraph_title_style),
-            ],
-            [
-                Paragraph(str(self.vehicle.production_year), paragraph_content_style),
-                Paragraph(self.vehicle.vin, paragraph_content_style),
-                Paragraph(str(self.vehicle.kilometrage), paragraph_content_style),
-                Paragraph(self.vehicle.gearbox_type.value.capitalize(), paragraph_content_style),
-            ],
-        ]
-        table = Table(data, colWidths=self.width * 0.2, rowHeights=self.height * 0.04)
-        table.setStyle(
-            TableStyle(
-                [
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                    ("GRID", (0, 0), (-1, -1), 0.5, "black"),
-                ]
-            )
-        )
-        self.data.append(table)
-        self.data.append(Spacer(1, 50))
-
-    def prepare_meta_table(self) -> None:
-        meta_style = self.styles["TableMeta"]
-        self.data.append(Paragraph(self.now.strftime(self.datetime_format), meta_style))
-
-    def prepare_fuel_table(self) -> None:
-        refuel_data = sorted(self.vehicle.refuels, key=lambda r: r.date, reverse=True)
-
-        headers = [
-            [
-                Paragraph("Date", self.styles["ParagraphTitle"]),
-                Paragraph("Amount [l]", self.styles["ParagraphTitle"]),
-                Paragraph("Price", self.styles["ParagraphTitle"]),
-                Paragraph("Kilometrage", self.styles["ParagraphTitle"]),
-                Paragraph("Person", self.styles["ParagraphTitle"]),
-            ],
-        ]
-
-        cells = []
-        for r in refuel_data:
-            cells.append(
-                [
-                    Paragraph(r.date.strftime(self.datetime_format), self.styles["ParagraphCell"]),
-                    Paragraph(str(r.fuel_amount), self.styles["ParagraphCell"]),
-                    Paragraph(str(r.price), self.styles["ParagraphCell"]),
-                    Paragraph(str(r.kilometrage_during_refuel), self.styles["ParagraphCell"]),
-                    Paragraph(r.user.name, self.styles["ParagraphCell"]),
-                ]
-            )
-
-        table = Table(headers + cells, colWidths=self.width * 0.15, rowHeights=self.height * 0.04)
-        table.setStyle(
-            TableStyle(
-                [
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                    ("GRID", (0, 0), (-1, -1), 0.5, "black"),
-                ]
-            )
-        )
-        self.data.append(table)
-
-    def report(self) -> BytesIO:
-        self.prepare_meta_table()
-        self.prepare_title_table()
-        self.prepare_car_data_table()
-        self.prepare_fuel_table()
-        self.doc.build(self.data)
+        row_height = self.height * 0.04
+        column_width = self.width * 0.2
+        left = (self.width - column_width * len(self.car_headers)) / 2
+        top = self.y
+        values = [str(self.header.production_year), self.header.vin, str(self.header.kilometrage), self.header.gearbox_type.capitalize()]
+        self.draw_row(self.car_headers, left, column_width, row_height, "Helvetica-Bold", 12)
+        self.draw_row(values, left, column_width, row_height, "Helvetica", 10)
+        self.canvas.setLineWidth(0.5)
+        self.canvas.grid([left + column_width * i for i in range(len(self.car_headers) + 1)], [top, top - row_height, self.y])
+        self.y -= 50
+
+    def prepare_range(self) -> None:
+        if self.date_from is None and self.date_to is None:
+            return
+        date_from = self.date_from.strftime(self.datetime_format) if self.date_from else "..."
+        date_to = self.date_to.strftime(self.datetime_format) if self.date_to else "..."
+        self.draw_row([f"Refuels from {date_from} to {date_to}"], self.margin, self.width - 2 * self.margin, self.fuel_row_height, "Helvetica", 10)
+
+    def prepare_fuel_table_header(self) -> None:
+        self.fuel_row_edges = [self.y]
+        self.draw_row(self.fuel_headers, self.fuel_table_left, self.fuel_column_width, self.height * 0.04, "Helvetica-Bold", 12)
+        self.fuel_row_edges.append(self.y)
+
+    def finish_page(self) -> None:
+        xs = [self.fuel_table_left + self.fuel_column_width * i for i in range(len(self.fuel_headers) + 1)]
+        self.canvas.setLineWidth(0.5)
+        self.canvas.grid(xs, self.fuel_row_edges)
+
+    def add_refuels(self, rows: Iterable[RefuelRow]) -> None:
+        started = time.perf_counter()
+        for date, fuel_amount, price, kilometrage, user_name in rows:
+            if self.y - self.fuel_row_height < self.margin:
+                self.finish_page()
+                self.canvas.showPage()
+                self.font = None
+                self.y = self.height - self.margin
+                self.prepare_fuel_table_header()
+            values = [date.strftime(self.datetime_format), str(fuel_amount), str(price), str(kilometrage), user_name]
+            self.draw_row(values, self.fuel_table_left, self.fuel_column_width, self.fuel_row_height, "Helvetica", 10)
+            self.fuel_row_edges.append(self.y)
+        self.render_time += time.perf_counter() - started
+
+    def report(self) -> bytes:
+        started = time.perf_counter()
+        self.finish_page()
+        self.canvas.save()
+        self.render_time += time.perf_counter() - started
         return self.buffer.getvalue()
+
+
+def start_report_executor() -> None:
+    global report_executor
+    # Forking would copy the event loop, engine pools and open sockets of the running worker into the children.
+    report_executor = ProcessPoolExecutor(max_workers=REPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
+def get_report_executor() -> ProcessPoolExecutor:
+    if report_executor is None:
+        raise RuntimeError("The report executor is started in the app lifespan.")
+    return report_executor
+
+
+def shutdown_report_executor() -> None:
+    global report_executor
+    if report_executor is not None:
+        report_executor.shutdown(cancel_futures=True)
+        report_executor = None
+
+
+def get_report_filename(vehicle: Vehicle) -> str:
+    return f"vehicle_{vehicle.id}_{vehicle.registration_number}_report.pdf"
+
+
+async def get_fuel_report_jobs(session: AsyncSession, vehicles: Sequence[Vehicle]) -> list[FuelReportJob]:
+    versions = await get_report_versions(session, vehicles)
+    reports = {vehicle.id: report_cache.get(vehicle.id, versions[vehicle.id]) for vehicle in vehicles}
+    rows = await get_refuel_rows_by_vehicle(session, [vehicle_id for vehicle_id, report in reports.items() if report is None])
+    return [
+        FuelReportJob(vehicle.id, get_report_filename(vehicle), versions[vehicle.id], ReportHeader.from_vehicle(vehicle), reports[vehicle.id], rows[vehicle.id])
+        for vehicle in vehicles
+    ]
+
+
+def render_fuel_report(header: ReportHeader, rows: list[RefuelRow]) -> tuple[bytes, float]:
+    generator = VehicleFuelUsageReportGenerator(header)
+    generator.add_refuels(rows)
+    return generator.report(), generator.render_time
+
+
+async def render_fuel_report_in_pool(job: FuelReportJob) -> tuple[str, bytes]:
+    report, render_time = await asyncio.get_running_loop().run_in_executor(get_report_executor(), render_fuel_report, job.header, job.rows)
+    REPORT_RENDER_DURATION.observe(render_time)
+    report_cache.set(job.vehicle_id, job.version, report)
+    return job.filename, report
+
+
+async def stream_fuel_reports(jobs: list[FuelReportJob]) -> AsyncIterator[bytes]:
+    stream = StreamBuffer()
+    pending = []
+    try:
+        with zipfile.ZipFile(stream, "w") as archive:
+            for job in jobs:
+                if job.report is not None:
+                    archive.writestr(job.filename, job.report)
+                else:
+                    pending.append(asyncio.create_task(render_fuel_report_in_pool(job)))
+            yield stream.pop()
+            for task in asyncio.as_completed(pending):
+                filename, report = await task
+                archive.writestr(filename, report)
+                yield stream.pop()
+        yield stream.pop()
+    finally:
+        for task in pending:
+            task.cancel()
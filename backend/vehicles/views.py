@@ -1,13 +1,31 @@
-from commons import Page, get_filters, get_from_qs_or_404, raise_perm_error, validate_company_reference, validate_obj_reference
+from datetime import datetime
+
+from batches import BATCH_MAX_SIZE, BatchResult, check_item_company_reference, create_batch, delete_batch, update_batch
+from commons import (
+    Page,
+    etag_matches,
+    get_filters,
+    get_from_qs_or_404,
+    paginate,
+    raise_perm_error,
+    raise_validation_error,
+    render,
+    serialize,
+    validate_company_reference,
+    validate_obj_reference,
+    with_load_options,
+)
 from companies.models import Company
-from dependencies import LoginReqDep, SessionDep
-from fastapi import APIRouter, Query, Response, status
-from fastapi_pagination.ext.sqlalchemy import paginate
+from dependencies import FieldsetDep, LoginReqDep, SessionDep
+from fastapi import APIRouter, Body, File, Header, Query, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from imports import ImportFormat, ImportReport, check_company_reference, import_rows
+from monitoring.metrics import REPORT_RENDER_DURATION
 from permissions import require_role
 from sqlalchemy.sql import Select
 from users.models import User, UserRole
-from vehicles.models import Vehicle, VehicleCreate, VehicleRead
-from vehicles.utils import VehicleFuelUsageReportGenerator
+from vehicles.models import Vehicle, VehicleBatchUpdate, VehicleCreate, VehicleRead
+from vehicles.utils import ReportHeader, VehicleFuelUsageReportGenerator, get_refuel_rows_query, get_report_versions, report_cache, stream_refuel_rows
 
 router = APIRouter(prefix="/vehicles", tags=["vehicles"])
 
@@ -20,6 +38,7 @@ def get_queryset(request_user: User) -> Select[Vehicle]:
 async def list_vehicles(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     company_id: int = Query(None),
     search: str = Query(None, description="Search by model or registration number"),
     status: str = Query(None, description="Filter by vehicle availability status"),
@@ -29,7 +48,48 @@ async def list_vehicles(
     qs = Vehicle.with_search(qs, search)
     qs = Vehicle.with_status(qs, status)
 
-    return paginate(session, qs)
+    return await paginate(session, qs, VehicleRead, fieldset)
+
+
+@router.post("/import/")
+async def import_vehicles(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    file: UploadFile = File(...),
+    import_format: ImportFormat = Query(ImportFormat.CSV, alias="format"),
+) -> ImportReport:
+    return await import_rows(session, request_user, file, import_format, Vehicle, VehicleCreate, (check_company_reference,))
+
+
+@router.post("/batch/")
+async def create_vehicles(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    vehicles: list[VehicleCreate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    return await create_batch(session, request_user, Vehicle, vehicles, (check_item_company_reference,))
+
+
+@router.put("/batch/")
+async def update_vehicles(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    vehicles: list[VehicleBatchUpdate] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    result = await update_batch(session, request_user, get_queryset(request_user), Vehicle, vehicles, (check_item_company_reference,))
+    report_cache.invalidate(*(item.id for item in result.results if not item.errors))
+    return result
+
+
+@router.delete("/batch/")
+async def delete_vehicles(
+    session: SessionDep,
+    request_user: LoginReqDep,
+    ids: list[int] = Body(max_length=BATCH_MAX_SIZE),
+) -> BatchResult:
+    result = await delete_batch(session, get_queryset(request_user), Vehicle, ids)
+    report_cache.invalidate(*(item.id for item in result.results if not item.errors))
+    return result
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -37,27 +97,27 @@ async def create_vehicle(
     session: SessionDep,
     request_user: LoginReqDep,
     vehicle: VehicleCreate,
-    response: Response,
 ) -> VehicleRead:
-    validate_obj_reference(session, vehicle, Company, vehicle.company_id)
-    validate_company_reference(session, vehicle, request_user)
+    await validate_obj_reference(session, vehicle, Company, vehicle.company_id)
+    await validate_company_reference(session, vehicle, request_user)
 
     db_vehicle = Vehicle.model_validate(vehicle)
     session.add(db_vehicle)
-    session.commit()
-    session.refresh(db_vehicle)
-    response.status_code = status.HTTP_201_CREATED
-    return db_vehicle
+    await session.commit()
+    await session.refresh(db_vehicle)
+    return render(await serialize(session, VehicleRead, db_vehicle), status.HTTP_201_CREATED)
 
 
 @router.get("/{vehicle_id}/")
 async def retrive_vehicle(
     session: SessionDep,
     request_user: LoginReqDep,
+    fieldset: FieldsetDep,
     vehicle_id: int,
 ) -> VehicleRead:
-    qs = get_queryset(request_user)
-    return get_from_qs_or_404(session, qs, vehicle_id)
+    qs = with_load_options(get_queryset(request_user), VehicleRead, fieldset)
+    db_vehicle = await get_from_qs_or_404(session, qs, vehicle_id)
+    return render(await serialize(session, VehicleRead, db_vehicle, fieldset))
 
 
 @router.get("/{vehicle_id}/reports/fuel/")
@@ -66,14 +126,29 @@ async def generate_vehicle_fuel_report(
     session: SessionDep,
     request_user: LoginReqDep,
     vehicle_id: int,
+    date_from: datetime = Query(None, description="Include refuels from this date"),
+    date_to: datetime = Query(None, description="Include refuels up to this date"),
+    if_none_match: str = Header(None),
 ) -> Response:
     if request_user.is_worker:
         raise_perm_error()
-    qs = get_queryset(request_user)
-    vehicle = get_from_qs_or_404(session, qs, vehicle_id)
-    generator = VehicleFuelUsageReportGenerator(vehicle)
-    headers = {"Content-Disposition": f'inline; filename="vehicle_{vehicle.registration_number}_report.pdf"'}
-    return Response(content=generator.report(), media_type="application/pdf", headers=headers)
+    if date_from and date_to and date_from > date_to:
+        raise_validation_error("date_from must not be later than date_to.", {"date_from": date_from.isoformat(), "date_to": date_to.isoformat()})
+    vehicle = await get_from_qs_or_404(session, get_queryset(request_user), vehicle_id)
+    version = (await get_report_versions(session, [vehicle], date_from, date_to))[vehicle.id]
+    headers = {"ETag": f'"{version}"', "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if (report := report_cache.get(vehicle.id, version)) is None:
+        generator = VehicleFuelUsageReportGenerator(ReportHeader.from_vehicle(vehicle), date_from, date_to)
+        async for rows in stream_refuel_rows(session, get_refuel_rows_query(vehicle.id, date_from, date_to)):
+            await run_in_threadpool(generator.add_refuels, rows)
+        report = await run_in_threadpool(generator.report)
+        REPORT_RENDER_DURATION.observe(generator.render_time)
+        report_cache.set(vehicle.id, version, report)
+    headers["Content-Disposition"] = f'inline; filename="vehicle_{vehicle.registration_number}_report.pdf"'
+    return Response(content=report, media_type="application/pdf", headers=headers)
 
 
 @router.put("/{vehicle_id}/")
@@ -83,15 +158,16 @@ async def update_vehicle(
     vehicle_id: int,
     vehicle: VehicleCreate,
 ) -> VehicleRead:
-    validate_obj_reference(session, vehicle, Company, vehicle.company_id)
-    validate_company_reference(session, vehicle, request_user)
+    await validate_obj_reference(session, vehicle, Company, vehicle.company_id)
+    await validate_company_reference(session, vehicle, request_user)
 
     qs = get_queryset(request_user)
-    db_vehicle = get_from_qs_or_404(session, qs, vehicle_id)
+    db_vehicle = await get_from_qs_or_404(session, qs, vehicle_id)
     db_vehicle.sqlmodel_update(vehicle)
-    session.commit()
-    session.refresh(db_vehicle)
-    return db_vehicle
+    await session.commit()
+    report_cache.invalidate(vehicle_id)
+    await session.refresh(db_vehicle)
+    return render(await serialize(session, VehicleRead, db_vehicle))
 
 
 @router.delete("/{vehicle_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -102,7 +178,8 @@ async def delete_vehicle(
     response: Response,
 ) -> None:
     qs = get_queryset(request_user)
-    db_vehicle = get_from_qs_or_404(session, qs, vehicle_id)
-    session.delete(db_vehicle)
-    session.commit()
+    db_vehicle = await get_from_qs_or_404(session, qs, vehicle_id)
+    await session.delete(db_vehicle)
+    await session.commit()
+    report_cache.invalidate(vehicle_id)
     response.status_code = status.HTTP_204_NO_CONTENT